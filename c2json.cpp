@@ -122,6 +122,7 @@ using namespace std;
 #define KindNameStruct      QT("struct")
 #define KindNameEnum        QT("enum")
 #define KindNameFunction    QT("function")
+#define KindNameTypedef     QT("typedef")
 
 // stringified field names
 #define FieldNameIdent      QT("identifier")
@@ -129,6 +130,7 @@ using namespace std;
 #define FieldNameReturn     QT("return")
 #define FieldNameKind       QT("kind")
 #define FieldNameValue      QT("value")
+#define FieldNameType       QT("type")
 
 // JSON component strings
 #define JsonAssign          " : "
@@ -343,6 +345,16 @@ public:
             writeCommon(typeDecl, KindNameEnum);
             writeEnumBody(type->getAs<EnumType>()->getDecl());
         }
+        else if (not type->isFunctionPointerType()
+                 and not type->isFunctionType())
+        {
+            // plain alias (i.e. typedef uint32_t handle_t), the aliased type
+            // is resolved by the parser
+            writeCommon(typeDecl, KindNameTypedef);
+            cout << "],\n" IndentL2 FieldNameType JsonAssign
+                 << quotify(toString(type))
+                 << "\n" Indent "}";
+        }
     }
 };
 
@@ -11,18 +11,18 @@ void stream_reset(stream_t* s)
 
 static bool _buf_copy(stream_t* s,
                       void* dest,
-                      const size_t dest_len,
                       const void* src,
-                      const size_t src_len)
+                      const size_t len,
+                      const size_t avail)
 {
-        
-    if (len > dest_len)
+
+    if (len > avail)
     {
         return false;
     }
-    
-    s->cur += (uint_fast16_t)src_len;
-    memcpy(dest, src, src_len);
+
+    s->cur += (uint_fast16_t)len;
+    memcpy(dest, src, len);
 
     return true;
 }
@@ -36,17 +36,17 @@ static bool _buf_copy(stream_t* s,
 bool stream_code_array(stream_t* s,
                        element_coder_t code,
                        void* _array,
-                       size_t elm_count,    
+                       size_t elm_count,
                        size_t elm_size)
 {
     uint8_t* arr = (uint8_t*)_array;
     size_t i = 0;
     bool rc = true;
-    for(; (i < elm_count) && rc; i += elm_size)
+    for(; (i < elm_count) && rc; i++)
     {
-        rc = code(s, &arr[i]);
+        rc = code(s, &arr[i * elm_size]);
     }
-    
+
     return rc;
 }
 
@@ -55,20 +55,31 @@ bool stream_code_array(stream_t* s,
 // encoder
 //
 
-void stream_encode_buf(stream_t* s, const void* v, size_t len)
+bool stream_encode_buf(stream_t* s, const void* v, size_t len)
 {
     size_t avail = s->capacity - s->cur;
-    return _buf_copy(s, s->buf[s->cur], avail, v, len);
+    bool rc = _buf_copy(s, &s->buf[s->cur], v, len, avail);
+    s->used = s->cur;
+    return rc;
 }
 
 
-bool stream_encode_cstring(stream_t* s, const char** src)
+bool stream_encode_cstring(stream_t* s, void* v)
 {
-    const char* str = *src;
+    const char* str = *(const char**)v;
     return stream_encode_buf(s, str, strlen(str) + 1);
 }
 
 
+bool stream_encode_lpstring(stream_t* s, void* v)
+{
+    const char* str = *(const char**)v;
+    const uint32_t len = (uint32_t)strlen(str);
+    return stream_encode_buf(s, &len, sizeof(len))
+        && stream_encode_buf(s, str, len + 1);
+}
+
+
 bool stream_encode_int8(stream_t* s, void* v)
 {
     return stream_encode_buf(s, v, sizeof(int8_t));
@@ -76,12 +87,12 @@ bool stream_encode_int8(stream_t* s, void* v)
 
 bool stream_encode_uint8(stream_t* s, void* v)
 {
-    return stream_encode_buf(s, v, sizeof(int8_t));
+    return stream_encode_buf(s, v, sizeof(uint8_t));
 }
 
 bool stream_encode_int16(stream_t* s, void* v)
 {
-    return stream_encode_buf(s, v, sizeof(int8_t));
+    return stream_encode_buf(s, v, sizeof(int16_t));
 }
 
 bool stream_encode_uint16(stream_t* s, void* v)
@@ -114,7 +125,7 @@ bool stream_encode_float(stream_t* s, void* v)
     return stream_encode_buf(s, v, sizeof(float));
 }
 
-bool stream_encode_double(stream_t* s, size_t len)
+bool stream_encode_double(stream_t* s, void* v)
 {
     return stream_encode_buf(s, v, sizeof(double));
 }
@@ -127,29 +138,56 @@ bool stream_encode_double(stream_t* s, size_t len)
 //
 
 
-void stream_decode_buf(stream_t* s, void* v, size_t len)
+bool stream_decode_buf(stream_t* s, void* v, size_t len)
 {
     const size_t remaining = s->used - s->cur;
-    return _buf_copy(s, v, len, &s->buf[s->cur], remaining);
+    return _buf_copy(s, v, &s->buf[s->cur], len, remaining);
 }
 
 
 
 // decode a c-string
-bool stream_decode_cstring(stream_t* s, char** dest)
+bool stream_decode_cstring(stream_t* s, void* v)
 {
-    *dest = (char*)&s->buf[s->cur];
-    const size_t len = strlen(str) + 1;
-    const size_t remaining = s->capacity - s->cur;
-    if (len > remaining)
+    char** dest = (char**)v;
+    const size_t remaining = s->used - s->cur;
+    const char* str = (const char*)&s->buf[s->cur];
+    const char* end = memchr(str, '\0', remaining);
+    if (end == NULL)
     {
         *dest = NULL;
         return false;
     }
-    
+
     // pop the string
-    s->cur -= (uint_fast16_t)len;
-    
+    *dest = (char*)str;
+    s->cur += (uint_fast16_t)(end - str + 1);
+
+    return true;
+}
+
+
+// decode a length-prefixed string
+bool stream_decode_lpstring(stream_t* s, void* v)
+{
+    char** dest = (char**)v;
+    uint32_t len = 0;
+    *dest = NULL;
+    if (!stream_decode_buf(s, &len, sizeof(len)))
+    {
+        return false;
+    }
+
+    const size_t remaining = s->used - s->cur;
+    if ((len >= remaining) || (s->buf[s->cur + len] != '\0'))
+    {
+        return false;
+    }
+
+    // pop the string
+    *dest = (char*)&s->buf[s->cur];
+    s->cur += (uint_fast16_t)(len + 1);
+
     return true;
 }
 
@@ -162,13 +200,13 @@ bool stream_decode_int8(stream_t* s, void* v)
 
 bool stream_decode_uint8(stream_t* s, void* v)
 {
-    return stream_decode_buf(s, v, sizeof(int8_t));
+    return stream_decode_buf(s, v, sizeof(uint8_t));
 }
 
 
 bool stream_decode_int16(stream_t* s, void* v)
 {
-    return stream_decode_buf(s, v, sizeof(int8_t));
+    return stream_decode_buf(s, v, sizeof(int16_t));
 }
 
 
@@ -208,8 +246,190 @@ bool stream_decode_float(stream_t* s, void* v)
 }
 
 
-bool stream_decode_double(stream_t* s, size_t len)
+bool stream_decode_double(stream_t* s, void* v)
 {
     return stream_decode_buf(s, v, sizeof(double));
 }
 
+
+
+
+//
+// table driven codec
+//
+
+// wire width of the scalar kinds (indexed by stream_kind_t)
+static const uint8_t _kind_width[] =
+{
+    sizeof(int8_t),
+    sizeof(uint8_t),
+    sizeof(int16_t),
+    sizeof(uint16_t),
+    sizeof(int32_t),
+    sizeof(uint32_t),
+    sizeof(int64_t),
+    sizeof(uint64_t),
+    sizeof(float),
+    sizeof(double)
+};
+
+
+bool stream_encode_struct(stream_t* s, const stream_desc_t* desc, const void* v)
+{
+    const uint8_t* base = (const uint8_t*)v;
+    uint32_t i = 0;
+    bool rc = true;
+
+    for (; (i < desc->field_count) && rc; i++)
+    {
+        const stream_field_t* f = &desc->fields[i];
+        const uint8_t* p = base + f->offset;
+        uint32_t n = 0;
+
+        switch (f->kind)
+        {
+        case STREAM_KIND_CSTRING:
+            for (; (n < f->count) && rc; n++, p += sizeof(char*))
+            {
+                rc = stream_encode_cstring(s, (void*)p);
+            }
+            break;
+
+        case STREAM_KIND_LPSTRING:
+            for (; (n < f->count) && rc; n++, p += sizeof(char*))
+            {
+                rc = stream_encode_lpstring(s, (void*)p);
+            }
+            break;
+
+        case STREAM_KIND_STRUCT:
+            for (; (n < f->count) && rc; n++, p += f->desc->size)
+            {
+                rc = stream_encode_struct(s, f->desc, p);
+            }
+            break;
+
+        default:
+            // scalars (and arrays of scalars) are contiguous on the wire
+            rc = stream_encode_buf(s, p, f->count * _kind_width[f->kind]);
+            break;
+        }
+    }
+
+    return rc;
+}
+
+
+bool stream_decode_struct(stream_t* s, const stream_desc_t* desc, void* v)
+{
+    uint8_t* base = (uint8_t*)v;
+    uint32_t i = 0;
+    bool rc = true;
+
+    for (; (i < desc->field_count) && rc; i++)
+    {
+        const stream_field_t* f = &desc->fields[i];
+        uint8_t* p = base + f->offset;
+        uint32_t n = 0;
+
+        switch (f->kind)
+        {
+        case STREAM_KIND_CSTRING:
+            for (; (n < f->count) && rc; n++, p += sizeof(char*))
+            {
+                rc = stream_decode_cstring(s, p);
+            }
+            break;
+
+        case STREAM_KIND_LPSTRING:
+            for (; (n < f->count) && rc; n++, p += sizeof(char*))
+            {
+                rc = stream_decode_lpstring(s, p);
+            }
+            break;
+
+        case STREAM_KIND_STRUCT:
+            for (; (n < f->count) && rc; n++, p += f->desc->size)
+            {
+                rc = stream_decode_struct(s, f->desc, p);
+            }
+            break;
+
+        default:
+            rc = stream_decode_buf(s, p, f->count * _kind_width[f->kind]);
+            break;
+        }
+    }
+
+    return rc;
+}
+
+
+bool stream_encode_struct_array(stream_t* s,
+                                const stream_desc_t* desc,
+                                const void* v,
+                                size_t count)
+{
+    const uint8_t* p = (const uint8_t*)v;
+    size_t n = 0;
+    bool rc = true;
+
+    for (; (n < count) && rc; n++, p += desc->size)
+    {
+        rc = stream_encode_struct(s, desc, p);
+    }
+
+    return rc;
+}
+
+
+bool stream_decode_struct_array(stream_t* s,
+                                const stream_desc_t* desc,
+                                void* v,
+                                size_t count)
+{
+    uint8_t* p = (uint8_t*)v;
+    size_t n = 0;
+    bool rc = true;
+
+    for (; (n < count) && rc; n++, p += desc->size)
+    {
+        rc = stream_decode_struct(s, desc, p);
+    }
+
+    return rc;
+}
+
+
+
+
+//
+// enum names
+//
+
+const char* stream_enum_name(const stream_enum_name_t* names,
+                             size_t count,
+                             int64_t value)
+{
+    size_t lo = 0;
+    size_t hi = count;
+
+    while (lo < hi)
+    {
+        const size_t mid = lo + (hi - lo) / 2;
+        if (names[mid].value < value)
+        {
+            lo = mid + 1;
+        }
+        else
+        {
+            hi = mid;
+        }
+    }
+
+    if ((lo < count) && (names[lo].value == value))
+    {
+        return names[lo].name;
+    }
+    return NULL;
+}
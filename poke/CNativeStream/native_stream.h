@@ -1,10 +1,11 @@
 #pragma once
+#include <stddef.h>
 #include <stdint.h>
 #include <stdbool.h>
 
-#ifndef __cplusplus
-exern "C" {
-#endif 
+#ifdef __cplusplus
+extern "C" {
+#endif
 
 typedef struct
 {
@@ -14,7 +15,7 @@ typedef struct
     uint8_t buf[];
 } stream_t;
 
-typedef bool (*element_coder_t)(stream_t* s, void* v)
+typedef bool (*element_coder_t)(stream_t* s, void* v);
 
 
 #define STREAM_DECLARE(name, capacity) \
@@ -22,7 +23,7 @@ typedef bool (*element_coder_t)(stream_t* s, void* v)
     {                                  \
         stream_t base;                 \
         uint8_t buf[capacity];         \
-    } _##name = {0, 0, capacity}; static stream_t* name = &_##name
+    } _##name = {0, 0, capacity}; static stream_t* name = &_##name.base
 
 void stream_reset(stream_t* s);
 
@@ -32,23 +33,41 @@ void stream_reset(stream_t* s);
 //
 
 // append len bytes to the output stream
-bool stream_encode_buf(stream_t* s, void* v, size_t len);
+bool stream_encode_buf(stream_t* s, const void* v, size_t len);
 
 // encode a c-string
 // NOTE:
-//      the extra level of indirection saves some logic in the code generator
-bool stream_encode_cstring(stream_t* s, const char** str);
+//      the extra level of indirection saves some logic in the code generator,
+//      v is a pointer to a (const) char*
+bool stream_encode_cstring(stream_t* s, void* v);
 
-// encode 
+// encode a length-prefixed string (<uint32_t length><bytes><NUL>)
+// NOTE:
+//      same calling convention as stream_encode_cstring. The length prefix
+//      spares the decoder the NUL scan
+bool stream_encode_lpstring(stream_t* s, void* v);
+
+bool stream_encode_int8(stream_t* s, void* v);
+bool stream_encode_uint8(stream_t* s, void* v);
+bool stream_encode_int16(stream_t* s, void* v);
+bool stream_encode_uint16(stream_t* s, void* v);
+bool stream_encode_int32(stream_t* s, void* v);
+bool stream_encode_uint32(stream_t* s, void* v);
+bool stream_encode_int64(stream_t* s, void* v);
+bool stream_encode_uint64(stream_t* s, void* v);
+bool stream_encode_float(stream_t* s, void* v);
+bool stream_encode_double(stream_t* s, void* v);
+
+// encode/decode an array element by element
 // NOTE:
 //      C flattens multi-dimensional arrays. When passing a multi-dimensional
 //      array, the function expects elm_count = D0 x D1 x .. DN, where Di
 //      is the ith dimension of the array
 bool stream_code_array(stream_t* s,
-                       element_coder_t codeer,
+                       element_coder_t code,
                        void* _array,
-                       size_t elm_count,    
-                       size_t elm_size)
+                       size_t elm_count,
+                       size_t elm_size);
 
 //
 // decoder
@@ -60,23 +79,99 @@ bool stream_decode_buf(stream_t* s, void* v, size_t len);
 // decode a c-string
 // NOTE:
 //      creates a shallow copy, that must be consumed prior to cleaining the
-//      call-stack
-bool stream_decode_cstring(stream_t* s, char** str);
-
+//      call-stack. v is a pointer to a char*
+bool stream_decode_cstring(stream_t* s, void* v);
 
+// decode a length-prefixed string
 // NOTE:
-//      C flattens multi-dimensional arrays. When passing a multi-dimensional
-//      array, the function expects elm_count = D0 x D1 x .. DN, where Di
-//      is the ith dimension of the array
-bool stream_decode_array(stream_t* s,
-                         element_coder_t decode,
-                         void* _array,
-                         size_t elm_count,    
-                         size_t elm_size)
+//      creates a shallow copy (the encoded NUL terminates the string in place)
+bool stream_decode_lpstring(stream_t* s, void* v);
+
+bool stream_decode_int8(stream_t* s, void* v);
+bool stream_decode_uint8(stream_t* s, void* v);
+bool stream_decode_int16(stream_t* s, void* v);
+bool stream_decode_uint16(stream_t* s, void* v);
+bool stream_decode_int32(stream_t* s, void* v);
+bool stream_decode_uint32(stream_t* s, void* v);
+bool stream_decode_int64(stream_t* s, void* v);
+bool stream_decode_uint64(stream_t* s, void* v);
+bool stream_decode_float(stream_t* s, void* v);
+bool stream_decode_double(stream_t* s, void* v);
 
 
+//
+// table driven codec
+//
+
+// field kinds understood by the generic struct codec
+typedef enum
+{
+    STREAM_KIND_INT8,
+    STREAM_KIND_UINT8,
+    STREAM_KIND_INT16,
+    STREAM_KIND_UINT16,
+    STREAM_KIND_INT32,
+    STREAM_KIND_UINT32,
+    STREAM_KIND_INT64,
+    STREAM_KIND_UINT64,
+    STREAM_KIND_FLOAT,
+    STREAM_KIND_DOUBLE,
+    STREAM_KIND_CSTRING,
+    STREAM_KIND_LPSTRING,
+    STREAM_KIND_STRUCT
+} stream_kind_t;
+
+struct stream_desc;
+
+// describes a single struct field
+typedef struct
+{
+    uint32_t offset;                 // offsetof the field within the struct
+    uint8_t kind;                    // stream_kind_t
+    uint32_t count;                  // flattened element count (1 if scalar)
+    const struct stream_desc* desc;  // nested descriptor (STREAM_KIND_STRUCT)
+} stream_field_t;
+
+// describes a struct as a table of fields
+typedef struct stream_desc
+{
+    const stream_field_t* fields;
+    uint32_t field_count;
+    uint32_t size;                   // sizeof the struct
+} stream_desc_t;
+
+// encode/decode the struct v using its field descriptor table
+bool stream_encode_struct(stream_t* s, const stream_desc_t* desc, const void* v);
+bool stream_decode_struct(stream_t* s, const stream_desc_t* desc, void* v);
+
+// encode/decode an array of count structs (flattened like stream_code_array)
+bool stream_encode_struct_array(stream_t* s,
+                                const stream_desc_t* desc,
+                                const void* v,
+                                size_t count);
+bool stream_decode_struct_array(stream_t* s,
+                                const stream_desc_t* desc,
+                                void* v,
+                                size_t count);
+
+
+//
+// enum names
+//
+
+// (value, name) entry of an enum name table sorted by value
+typedef struct
+{
+    int64_t value;
+    const char* name;
+} stream_enum_name_t;
+
+// binary search a sorted enum name table, returns NULL for unknown values
+const char* stream_enum_name(const stream_enum_name_t* names,
+                             size_t count,
+                             int64_t value);
 
 
-#ifndef __cplusplus
+#ifdef __cplusplus
 }
-#endif 
\ No newline at end of file
+#endif
@@ -0,0 +1,155 @@
+"""
+Compares the unrolled and table-driven cwriter codec modes. A synthetic API is
+generated in both modes, compiled with the local C compiler against
+native_stream.c, and the generated code size (lines, object .text bytes) and
+encode+decode round-trip throughput are reported.
+
+usage:
+    python bench_codec.py [struct-count] [iterations]
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+from cStringIO import StringIO
+sys.path.append('../') # permit access to parent directory modules
+from pycjson import parser
+import cwriter
+import synth
+
+streamDir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'CNativeStream')
+cc = os.environ.get('CC', 'cc')
+
+mainTemplate = """
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+STREAM_DECLARE(buf, 65535);
+
+%(stubs)s
+
+%(fill)s
+
+int main(int argc, char** argv)
+{
+    long iters = atol(argv[1]);
+    unsigned long long bytes = 0;
+    unsigned long long msgs = 0;
+    struct timespec t0, t1;
+%(decls)s
+    clock_gettime(CLOCK_MONOTONIC, &t0);
+    for (long n = 0; n < iters; n++)
+    {
+%(body)s
+    }
+    clock_gettime(CLOCK_MONOTONIC, &t1);
+    printf("%%llu %%llu %%f\\n", msgs, bytes,
+           (t1.tv_sec - t0.tv_sec) + (t1.tv_nsec - t0.tv_nsec) * 1e-9);
+    return 0;
+}
+"""
+
+roundTrip = """\
+        stream_reset(buf);
+        if (!%(encode)s) return 1;
+        bytes += buf->used;
+        buf->cur = 0;
+        if (!%(decode)s) return 1;
+        msgs++;"""
+
+
+def codecCall(mode, i, var):
+    name = synth.structName(i)[:-2]
+    if cwriter.codecMode == cwriter.CodecTable:
+        return 'stream_%s_struct(buf, &stream_desc_%s, &%s)' % (mode, name, var)
+    return 'stream_%s_%s(buf, &%s)' % (mode, name, var)
+
+
+def generateSource(records, header, count):
+    """
+    run cwriter over the records and wrap the result in a benchmark program
+    """
+    parser.reset()
+    parser.parse(StringIO(json.dumps(records)))
+    cwriter.reset()
+    cwriter.process(parser.getResults())
+    generated = str(cwriter.structs) + str(cwriter.funcs)
+
+    stubs = ['void %s(%s* v) { (void)v; }'
+             % (synth.funcName(i), synth.structName(i)) for i in range(count)]
+    decls = []
+    body = []
+    for i in range(count):
+        name = synth.structName(i)
+        decls.append('    static %s v%d, w%d; fill_%s(&v%d);'
+                     % (name, i, i, name[:-2], i))
+        body.append(roundTrip % {'encode': codecCall('encode', i, 'v%d' % i),
+                                 'decode': codecCall('decode', i, 'w%d' % i)})
+    prologue = '#include <stddef.h>\n#include "api.h"\n#include <native_stream.h>\n\n'
+    program = mainTemplate % {'stubs': '\n'.join(stubs),
+                              'fill': synth.fillFunctions(records),
+                              'decls': '\n'.join(decls),
+                              'body': '\n'.join(body)}
+    return prologue + generated, program
+
+
+def textSize(obj):
+    """
+    size of the .text section of an object file
+    """
+    out = subprocess.check_output(['size', obj]).splitlines()
+    return int(out[1].split()[0])
+
+
+def bench(records, header, count, iters, workDir):
+    """
+    build and run the benchmark for the current cwriter.codecMode
+    """
+    generated, program = generateSource(records, header, count)
+    base = os.path.join(workDir, cwriter.codecMode)
+    with open(os.path.join(workDir, 'api.h'), 'w') as outf:
+        outf.write(header)
+    with open(base + '.gen.c', 'w') as outf:
+        outf.write(generated)
+    with open(base + '.c', 'w') as outf:
+        outf.write('#include "%s.gen.c"\n' % cwriter.codecMode + program)
+    flags = ['-O2', '-std=gnu99', '-w', '-I', streamDir, '-I', workDir]
+    subprocess.check_call([cc] + flags + ['-fkeep-static-functions',
+                                          '-c', base + '.gen.c',
+                                          '-o', base + '.gen.o'])
+    subprocess.check_call([cc] + flags + [base + '.c',
+                                          os.path.join(streamDir, 'native_stream.c'),
+                                          '-o', base + '.exe'])
+    msgs, nbytes, secs = subprocess.check_output(
+        [base + '.exe', str(iters)]).split()
+    return {'lines': generated.count('\n'),
+            'text': textSize(base + '.gen.o'),
+            'msgs/s': int(msgs) / float(secs),
+            'MB/s': int(nbytes) / float(secs) / 1e6}
+
+
+if __name__ == '__main__':
+    count = 200
+    iters = 2000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        iters = int(sys.argv[2])
+    records, header = synth.synthesize(count)
+    workDir = tempfile.mkdtemp()
+    try:
+        print '%-10s %10s %12s %14s %10s' % ('mode', 'lines', 'text bytes',
+                                             'msgs/s', 'MB/s')
+        for mode in (cwriter.CodecUnrolled, cwriter.CodecTable):
+            cwriter.codecMode = mode
+            r = bench(records, header, count, iters, workDir)
+            print '%-10s %10d %12d %14.0f %10.1f' % (mode, r['lines'], r['text'],
+                                                    r['msgs/s'], r['MB/s'])
+    finally:
+        shutil.rmtree(workDir)
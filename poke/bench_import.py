@@ -0,0 +1,96 @@
+"""
+Compares the import time of eager and lazy (pywriter.lazy) binding modules.
+Synthetic APIs of increasing size are generated in both modes and byte
+compiled, then each module is imported in a fresh interpreter, and the time
+to import it and to first use a fixed number of its structs and methods is
+reported.
+
+usage:
+    python bench_import.py [struct-count ...]
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import py_compile
+import subprocess
+from cStringIO import StringIO
+sys.path.append('../') # permit access to parent directory modules
+from pycjson import parser, util
+import pywriter
+import synth
+
+# structs and methods touched after the import
+UsedCount = 20
+
+probe = """
+import sys
+import time
+sys.path.insert(0, %(dir)r)
+t0 = time.time()
+import %(module)s as api
+t1 = time.time()
+for name in %(structs)r:
+    getattr(api, name)()
+inst = api.ApiBase()
+for name in %(methods)r:
+    getattr(inst, name)
+t2 = time.time()
+print t1 - t0, t2 - t1
+"""
+
+
+def writeModule(decls, path, lazy):
+    """
+    generate the bindings for decls into path, and byte compile them
+    """
+    pywriter.lazy = lazy
+    pywriter.reset()
+    pywriter.process(decls)
+    with open(path, 'w') as outf:
+        outf.write(str(pywriter.structs) + '\n' + str(pywriter.funcs) + '\n')
+    py_compile.compile(path, doraise=True)
+
+
+def bench(count, workDir):
+    """
+    returns {mode: (module bytes, import seconds, first use seconds)}
+    """
+    records, header = synth.synthesize(count)
+    parser.reset()
+    parser.parse(StringIO(json.dumps(records)))
+    decls = parser.getResults()
+    used = range(min(UsedCount, count))
+    structs = [pywriter.normalizeType(synth.structName(i)) for i in used]
+    methods = [util.downCamelize(synth.funcName(i)) for i in used]
+
+    results = {}
+    for (mode, lazy) in (('eager', False), ('lazy', True)):
+        module = 'api_%s_%d' % (mode, count)
+        path = os.path.join(workDir, module + '.py')
+        writeModule(decls, path, lazy)
+        out = subprocess.check_output([sys.executable, '-c', probe % {
+            'dir': workDir, 'module': module,
+            'structs': structs, 'methods': methods}])
+        (imported, used) = [float(v) for v in out.split()]
+        results[mode] = (os.path.getsize(path + 'c'), imported, used)
+    return results
+
+
+if __name__ == '__main__':
+    counts = [int(c) for c in sys.argv[1:]] or [100, 1000, 5000]
+    workDir = tempfile.mkdtemp()
+    try:
+        print '%-8s %-6s %12s %12s %14s' % ('structs', 'mode', 'pyc bytes',
+                                            'import ms', 'first use ms')
+        for count in counts:
+            results = bench(count, workDir)
+            for mode in ('eager', 'lazy'):
+                (size, imported, used) = results[mode]
+                print '%-8d %-6s %12d %12.1f %14.1f' % (count, mode, size,
+                                                        imported * 1e3,
+                                                        used * 1e3)
+    finally:
+        shutil.rmtree(workDir)
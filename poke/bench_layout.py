@@ -0,0 +1,110 @@
+"""
+Compares decoding and encoding fixed-layout structs through the per-field
+stream calls of the pywriter generated classes with the ctypes layouts
+generated by pywriter.layouts. A synthetic API of fixed-layout structs
+(scalars, arrays and nested structs) is generated, and the time per message
+is reported for: encoding, decoding, and decoding followed by reading every
+top level field.
+
+usage:
+    python bench_layout.py [struct-count] [iterations]
+"""
+
+import sys
+import json
+import timeit
+from cStringIO import StringIO
+sys.path.append('../') # permit access to parent directory modules
+from pycjson import parser
+import pywriter
+import pystream
+import synth
+
+
+def loadBindings(count):
+    """
+    generate and exec the bindings of a fixed-layout synthetic API, returns
+    the namespace along with the decls of its structs
+    """
+    records, header = synth.synthesize(count, strings=False)
+    parser.reset()
+    parser.parse(StringIO(json.dumps(records)))
+    pywriter.layouts = True
+    pywriter.reset()
+    pywriter.process(parser.getResults())
+    ns = {}
+    exec str(pywriter.structs) in ns
+    structs = [t for t in parser.getResults() if t.kind == parser.KindStruct]
+    return ns, structs
+
+
+def timePerCall(fn, iters):
+    """
+    best of several runs, in microseconds per call
+    """
+    return min(timeit.repeat(fn, number=iters, repeat=5)) / iters * 1e6
+
+
+def bench(ns, t, iters):
+    """
+    returns {path: (encode us, decode us, decode+read us)} for the struct t
+    """
+    cls = ns[pywriter.normalizeType(t.identifier)]
+    layout = ns[pywriter.layoutNameForType(t)]
+    fields = [pywriter.normalizeField(f.identifier) for f in t.fields]
+    s = pystream.BinaryStream()
+    cls().writeToStream(s)
+    data = s.getvalue()
+
+    obj = cls(pystream.BinaryStream(data))
+    lay = pystream.BinaryStream(data).getLayout(layout)
+
+    def encode(v):
+        def run():
+            out = pystream.BinaryStream()
+            v.writeToStream(out)
+        return run
+
+    def decodeFields():
+        cls(pystream.BinaryStream(data))
+
+    def decodeLayout():
+        pystream.BinaryStream(data).getLayout(layout)
+
+    def read(decode):
+        def run():
+            v = decode()
+            for f in fields:
+                getattr(v, f)
+        return run
+
+    return {
+        'fields': (timePerCall(encode(obj), iters),
+                   timePerCall(decodeFields, iters),
+                   timePerCall(read(lambda: cls(pystream.BinaryStream(data))),
+                               iters)),
+        'layout': (timePerCall(encode(lay), iters),
+                   timePerCall(decodeLayout, iters),
+                   timePerCall(read(lambda: pystream.BinaryStream(data)
+                                        .getLayout(layout)), iters)),
+    }
+
+
+if __name__ == '__main__':
+    count = 50
+    iters = 2000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        iters = int(sys.argv[2])
+    ns, structs = loadBindings(count)
+    totals = {'fields': [0.0, 0.0, 0.0], 'layout': [0.0, 0.0, 0.0]}
+    for t in structs:
+        for (path, times) in bench(ns, t, iters).items():
+            for i in range(3):
+                totals[path][i] += times[i]
+    print '%d structs, mean us/message' % len(structs)
+    print '%-8s %10s %10s %14s' % ('path', 'encode', 'decode', 'decode+read')
+    for path in ('fields', 'layout'):
+        print '%-8s %10.2f %10.2f %14.2f' % tuple(
+            [path] + [v / len(structs) for v in totals[path]])
@@ -0,0 +1,160 @@
+"""
+Cache conformance check for the pipeline driver.
+
+A stub c2json (a shell script that logs each invocation and prints the canned
+test-outputs/test.json) is run by pipeline.translate over two headers in a
+scratch directory. The check verifies that an unchanged rerun is served from
+the cache without invoking the stub, and that changing a header, one of its
+includes, the compiler flags or the stub itself (whether given by path or
+resolved through PATH) invokes it again. Any mismatch fails the run.
+
+usage:
+    python cachecheck.py
+"""
+
+import os
+import sys
+import stat
+import shutil
+import tempfile
+sys.path.append('../') # permit access to parent directory modules
+import pipeline
+
+poke = os.path.dirname(os.path.abspath(__file__))
+cannedJson = os.path.join(poke, '..', 'test-outputs', 'test.json')
+
+stubScript = """#!/bin/sh
+echo "$1" >> %(log)s
+cat %(json)s
+"""
+
+
+class CheckError(Exception):
+    pass
+
+
+def writeStub(path, log):
+    """
+    write the stub c2json executable at path, logging its invocations to log
+    """
+    with open(path, 'w') as outf:
+        outf.write(stubScript % {'log': log,
+                                 'json': os.path.abspath(cannedJson)})
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+
+
+def touch(path):
+    """
+    move the modification time of path forward
+    """
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+
+def append(path, text):
+    with open(path, 'a') as outf:
+        outf.write(text)
+
+
+class Checker:
+    """
+    runs the translation and compares the stub invocations with the expected
+    ones
+    """
+    def __init__(self, workDir, headers):
+        self.log = os.path.join(workDir, 'invocations')
+        self.cacheDir = os.path.join(workDir, 'cache')
+        self.headers = headers
+        self.seen = 0
+
+    def invocations(self):
+        if not os.path.isfile(self.log):
+            return []
+        with open(self.log) as inf:
+            lines = inf.read().splitlines()
+        new = lines[self.seen:]
+        self.seen = len(lines)
+        return new
+
+    def expect(self, what, c2json, misses, flags=()):
+        """
+        translate the headers, only the headers in misses may invoke c2json
+        """
+        results = pipeline.translate(self.headers, flags, c2json, self.cacheDir)
+        ran = sorted(self.invocations())
+        if ran != sorted(misses):
+            raise CheckError('%s: expected c2json to run for %r, ran for %r'
+                             % (what, sorted(misses), ran))
+        for (header, (text, hit)) in zip(self.headers, results):
+            if hit == (header in misses):
+                raise CheckError('%s: wrong cache hit flag for %s'
+                                 % (what, header))
+            with open(cannedJson) as inf:
+                if text != inf.read():
+                    raise CheckError('%s: wrong output for %s' % (what, header))
+        print 'ok', what
+
+
+def run(workDir):
+    """
+    run every check in workDir
+    """
+    a = os.path.join(workDir, 'a.h')
+    b = os.path.join(workDir, 'b.h')
+    inc = os.path.join(workDir, 'inc.h')
+    append(inc, '#define INC 1\n')
+    append(a, '#include "inc.h"\nvoid a(void);\n')
+    append(b, 'void b(void);\n')
+    both = [a, b]
+
+    c = Checker(workDir, both)
+    stub = os.path.join(workDir, 'c2json')
+    writeStub(stub, c.log)
+
+    c.expect('cold cache', stub, both)
+    c.expect('warm cache', stub, [])
+    append(a, 'void a2(void);\n')
+    c.expect('header changed', stub, [a])
+    append(inc, '#define INC2 2\n')
+    c.expect('include changed', stub, [a])
+    c.expect('flags changed', stub, both, ('-DX',))
+    c.expect('same flags', stub, [], ('-DX',))
+    touch(stub)
+    c.expect('stub touched', stub, both)
+    c.expect('stub unchanged', stub, [])
+
+    # the same stub, given by name and resolved through PATH
+    path = os.environ.get('PATH', '')
+    os.environ['PATH'] = workDir + os.pathsep + path
+    try:
+        c.expect('resolved through PATH', 'c2json', [])
+        touch(stub)
+        c.expect('PATH stub touched', 'c2json', both)
+        c.expect('PATH stub unchanged', 'c2json', [])
+    finally:
+        os.environ['PATH'] = path
+
+    try:
+        pipeline.translate(both, (), 'no-such-c2json', c.cacheDir)
+    except ValueError:
+        print 'ok', 'missing c2json'
+    else:
+        raise CheckError('missing c2json: translate did not fail')
+
+
+def main(argv):
+    """
+    command line entry point
+    """
+    workDir = tempfile.mkdtemp()
+    try:
+        run(workDir)
+    except CheckError, e:
+        print 'FAIL:', e
+        sys.exit(1)
+    finally:
+        shutil.rmtree(workDir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
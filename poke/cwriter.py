@@ -14,7 +14,7 @@ http://www.yzhang.net/simple-rpc/
 
 import sys
 sys.path.append('../') # permit access to parent directory modules
-from pycjson import util, parser, sugar
+from pycjson import util, parser, sugar, stats, graph
 
 #
 # normalization transforms to be applied (these can be overriden by clients)
@@ -24,14 +24,39 @@ normallizeFunc = util.camelize
 normalizeField = util.downCamelize
 normalizeType  = util.camelize
 
+#
+# codec modes
+#
+CodecUnrolled  = 'unrolled' # dedicated encode/decode function per struct
+CodecTable     = 'table'    # const field descriptor table per struct, coded
+                            # by the generic interpreter in native_stream.c
+
+codecMode = CodecUnrolled
+
+#
+# string wire formats
+#
+StringWireNul    = 'cstring'  # NUL terminated
+StringWireLength = 'lpstring' # <length u32><bytes><NUL>, decoded without a scan
+
+stringWire = StringWireNul
+
+
 def funcNameForType(t, mode):
     return 'stream_' + mode + '_' + util.stripTypeDelim(t.identifier)
 
 
 def funcNameForField(f, mode):
     if f.typeInfo.isString():
-        return 'stream_' + mode + '_cstring'     
-    return funcNameForType(util.resolveDecl(f.typeInfo.declType), mode)
+        return 'stream_' + mode + '_' + stringWire
+    rt = util.resolveDecl(f.typeInfo.declType)
+    if rt.kind == sugar.KindEnum:
+        # enums travel as int32 (STREAM_KIND_INT32 in table mode)
+        return 'stream_' + mode + '_int32'
+    if rt.identifier == 'char':
+        # chars travel as int8 (STREAM_KIND_INT8 in table mode)
+        return 'stream_' + mode + '_int8'
+    return funcNameForType(rt, mode)
 
 
 def argForField(f, pre):
@@ -43,17 +68,69 @@ def flattenedDims(f):
     for i in f.typeInfo.subscripts:
         d *= i
     return str(d)
+
+
+def elementTypeForField(f):
+    if f.typeInfo.isString():
+        return 'char*'
+    return f.typeInfo.declType.identifier
+
+
+def descNameForType(t):
+    return 'stream_desc_' + util.stripTypeDelim(t.identifier)
+
+
+def enumNameForType(t):
+    if parser.isAnonymous(t):
+        # reserved identifier, can't clash with a (stripped) user type name
+        return '_Anonymous'
+    return util.stripTypeDelim(t.identifier)
+
+
+def fieldsNameForType(t):
+    return 'stream_fields_' + util.stripTypeDelim(t.identifier)
+
+
+def kindForField(f):
+    """
+    returns the stream_kind_t used to describe the field in a descriptor table
+    """
+    rt = util.resolveDecl(f.typeInfo.declType)
+    if f.typeInfo.isString():
+        return 'STREAM_KIND_' + stringWire.upper()
+    if rt.kind == sugar.KindStruct:
+        return 'STREAM_KIND_STRUCT'
+    if rt.kind == sugar.KindEnum:
+        return 'STREAM_KIND_INT32'
+    if rt.identifier == 'char':
+        return 'STREAM_KIND_INT8'
+    return 'STREAM_KIND_' + util.stripTypeDelim(rt.identifier).upper()
         
 
 #
 # create some buffers objects to hold the output
 #
 
-structs = util.OutputBuffer()
-funcs = util.OutputBuffer()
+structs = None
+funcs = None
  
  # type declarations already encountered
-declsSeen = {}
+declsSeen = None
+
+
+def reset(structsSink=None, funcsSink=None):
+    """
+    reset the writer to its initial state. The generated code is streamed into
+    the given sinks (in-memory buffers by default)
+    """
+    global structs, funcs, declsSeen
+    structs = util.OutputBuffer(sink=structsSink)
+    funcs = util.OutputBuffer(sink=funcsSink)
+    declsSeen = {}
+
+
+# initialize the output buffers
+reset()
   
     
 
@@ -62,21 +139,28 @@ declsSeen = {}
 #
 
 
-def writeArray(out, f, s, mode, pre):
+def callForArray(f, s, mode, pre):
     """
-    write an array encoder/decoder
+    returns the call that encodes/decodes an array
     """
+    if (codecMode == CodecTable) and (kindForField(f) == 'STREAM_KIND_STRUCT'):
+        # table mode has no per-struct coders to hand to stream_code_array
+        rt = util.resolveDecl(f.typeInfo.declType)
+        return ''.join(['stream_', mode, '_struct_array(', s,
+                        ', &', descNameForType(rt),
+                        ', ', argForField(f, pre),
+                        ', ', flattenedDims(f), ')'])
     fn = funcNameForField(f, mode)
-    out.writeln('stream_code_array(', s,
-              ', ', fn,
-              ', ', argForField(f, pre),
-              ', ', flattenedDims(f),
-              ', sizeof(', f.typeInfo.declType.identifier, '));')
+    return ''.join(['stream_code_array(', s,
+                    ', ', fn,
+                    ', ', argForField(f, pre),
+                    ', ', flattenedDims(f),
+                    ', sizeof(', elementTypeForField(f), '))'])
 
- 
-def writeField(out, f, s, mode, pre='_'):
+
+def callForField(f, s, mode, pre='_'):
     """
-    write the decoder for the field
+    returns the call that encodes/decodes the field
     """
     rt = util.resolveDecl(f.typeInfo.declType)
     
@@ -84,11 +168,20 @@ def writeField(out, f, s, mode, pre='_'):
     transcoders[rt.kind](rt)
     
     if f.typeInfo.isArray():
-        pass
-        writeArray(out, f, s, mode, pre)
-    else:
-        fn = funcNameForField(f, mode)
-        out.writeln(fn, '(', s, ', ', argForField(f, pre), ');')
+        return callForArray(f, s, mode, pre)
+    if (codecMode == CodecTable) and (kindForField(f) == 'STREAM_KIND_STRUCT'):
+        return ''.join(['stream_', mode, '_struct(', s,
+                        ', &', descNameForType(rt),
+                        ', ', argForField(f, pre), ')'])
+    fn = funcNameForField(f, mode)
+    return ''.join([fn, '(', s, ', ', argForField(f, pre), ')'])
+
+ 
+def writeField(out, f, s, mode, pre='_'):
+    """
+    write the decoder for the field
+    """
+    out.writeln(callForField(f, s, mode, pre), ';')
         
 
 def visitPrerequisites(t):
@@ -97,7 +190,7 @@ def visitPrerequisites(t):
     proceeding
     """
     for f in t.fields:
-        t = f.typeInfo.declType
+        t = util.resolveDecl(f.typeInfo.declType)
         transcoders[t.kind](t)
 
 
@@ -111,17 +204,50 @@ def writeStructEncoderOrDecoder(t, mode):
     # visit prerequisites before proceeding
     visitPrerequisites(t)
     
-    out.writeln('static void ', funcNameForType(t, mode),
-                '(stream_t* s, ', t.identifier, '* v) {')
+    out.writeln('static bool ', funcNameForType(t, mode),
+                '(stream_t* s, void* _v) {')
     
     out.incIndent()
+    out.writeln(t.identifier, '* v = (', t.identifier, '*)_v;')
     for f in t.fields:
-        writeField(structs, f, 's', mode, 'v->')
+        out.writeln('if (!', callForField(f, 's', mode, 'v->'), ') return false;')
+    out.writeln('return true;')
     out.decIndent()
     out.write('}\n\n')
     # return the identifier    
 
 
+def writeStructDesc(t):
+    """
+    write the field descriptor table for a structure
+    """
+    out = structs
+    
+    # nested descriptors must be defined before they are referenced
+    visitPrerequisites(t)
+    
+    fields = 'NULL'
+    if len(t.fields):
+        fields = fieldsNameForType(t)
+        out.writeln('static const stream_field_t ', fields, '[] = {')
+        out.incIndent()
+        for f in t.fields:
+            rt = util.resolveDecl(f.typeInfo.declType)
+            desc = 'NULL'
+            if kindForField(f) == 'STREAM_KIND_STRUCT':
+                desc = '&' + descNameForType(rt)
+            out.writeln('{offsetof(', t.identifier, ', ', f.identifier, '), ',
+                        kindForField(f), ', ',
+                        flattenedDims(f), ', ',
+                        desc, '},')
+        out.decIndent()
+        out.writeln('};')
+    out.writeln('static const stream_desc_t ', descNameForType(t), ' = {',
+                fields, ', ', str(len(t.fields)),
+                ', sizeof(', t.identifier, ')};')
+    out.write('\n')
+
+
 def writeStruct(t):
     """
     write struct encoder and decoder
@@ -135,9 +261,72 @@ def writeStruct(t):
     declsSeen[t] = None
     declsSeen[rt] = None
     
-    writeStructEncoderOrDecoder(rt, 'encode')
-    writeStructEncoderOrDecoder(rt, 'decode')
+    if codecMode == CodecTable:
+        writeStructDesc(rt)
+    else:
+        writeStructEncoderOrDecoder(rt, 'encode')
+        writeStructEncoderOrDecoder(rt, 'decode')
+    structs.boundary()
+
+
+
+#
+# enum name tables
+#
+
+def isDense(values):
+    """
+    true if a value indexed array of the (sorted, unique) values is at most
+    half empty
+    """
+    return (values[-1] - values[0] + 1) <= 2 * len(values)
+
 
+def writeEnum(t):
+    """
+    write the value -> name table of an enum along with its lookup function
+    stream_<enum>_to_string. Dense enums are indexed directly, sparse enums are
+    binary searched
+    """
+    if declsSeen.has_key(t) or not len(t.byValue):
+        return
+    declsSeen[t] = None
+
+    name = enumNameForType(t)
+    table = 'stream_names_' + name
+    values = sorted(t.byValue)
+    out = structs
+    if isDense(values):
+        out.writeln('static const char* const ', table, '[] = {')
+        out.incIndent()
+        for v in range(values[0], values[-1] + 1):
+            if t.byValue.has_key(v):
+                out.writeln('"', t.byValue[v], '",')
+            else:
+                out.writeln('NULL,')
+        out.decIndent()
+        out.writeln('};')
+        out.writeln('static const char* stream_', name,
+                    '_to_string(int64_t v) {')
+        out.incIndent()
+        out.writeln('if ((v < ', str(values[0]), ') || (v > ', str(values[-1]),
+                    ')) return NULL;')
+        out.writeln('return ', table, '[v - (', str(values[0]), ')];')
+    else:
+        out.writeln('static const stream_enum_name_t ', table, '[] = {')
+        out.incIndent()
+        for v in values:
+            out.writeln('{', str(v), ', "', t.byValue[v], '"},')
+        out.decIndent()
+        out.writeln('};')
+        out.writeln('static const char* stream_', name,
+                    '_to_string(int64_t v) {')
+        out.incIndent()
+        out.writeln('return stream_enum_name(', table, ', ', str(len(values)),
+                    ', v);')
+    out.decIndent()
+    out.writeln('}\n')
+    out.boundary()
 
 
 #
@@ -163,12 +352,12 @@ def writeFunction(t):
     
     # write out temp vars to hold function args
     for f in t.fields:
-        tn = f.typeInfo.declType.identifier
-        funcs.writeln(tn,  ' _', f.identifier, ';')
+        dims = ''.join(['[%d]' % n for n in f.typeInfo.subscripts])
+        funcs.writeln(elementTypeForField(f),  ' _', f.identifier, dims, ';')
 
     # write out temp var to capture return value
     if not t.returnInfo.isVoid():
-        funcs.writeln(t.returnType.identifier, ' retv;')
+        funcs.writeln(t.returnInfo.declType.identifier, ' retv;')
     
     # decode input stream into temp vars
     for f in t.fields:
@@ -182,16 +371,17 @@ def writeFunction(t):
     funcs.write(t.identifier)
     sep = '('
     for f in t.fields:
-        funcs.write(sep,
-                    f.typeInfo.getInputArgumentModifier(),
-                    '_',
-                    f.identifier)
+        # strings are decoded into a char* temp, which is passed as is
+        mod = ''
+        if not f.typeInfo.isString():
+            mod = f.typeInfo.getInputArgumentModifier()
+        funcs.write(sep, mod, '_', f.identifier)
         sep = ','
     funcs.write(');\n')
     
     # capture return value
     if not t.returnInfo.isVoid():
-        writeField(funcs, t.returnInfo, 'outs', 'encode', '')
+        writeField(funcs, sugar.VarDecl('retv', t.returnInfo), 'outs', 'encode', '')
 
     # capture in/out params
     for f in t.fields:
@@ -200,6 +390,7 @@ def writeFunction(t):
        
     funcs.decIndent()
     funcs.writeln('}\n')
+    funcs.boundary()
     
     
 def writeNothing(t): pass
@@ -209,19 +400,61 @@ transcoders = {
     parser.KindStruct   : writeStruct,
     parser.KindEnum     : writeNothing,
     parser.KindBuiltIn  : writeNothing,
+    parser.KindAlias    : writeNothing,
+}
+
+
+# decls written when processed (structs are written as prerequisites of the
+# functions that use them)
+topLevel = {
+    parser.KindFunction : writeFunction,
+    parser.KindEnum     : writeEnum,
 }
 
 
+def processDecl(t):
+    if not topLevel.has_key(t.kind):
+        return
+    if stats.enabled:
+        start = stats.clock()
+        topLevel[t.kind](t)
+        stats.declTime('cwriter', t.identifier, stats.clock() - start)
+    else:
+        topLevel[t.kind](t)
+
+
 def process(decls):
-    for t in decls:
-        if t.kind == parser.KindFunction:
-            writeFunction(t)
+    with stats.timed('cwriter.process'):
+        decls = graph.select(decls)
+        for t in decls:
+            processDecl(t)
     
 
-if __name__ == '__main__':
+def main(argv):
+    """
+    usage: cwriter.py <json-file> [output-prefix [max-bytes]]
+    """
     # parse the given input file
-    with open(sys.argv[1]) as inf: parser.parse(inf)
-    process(parser.getResults())
-    print structs
-    print funcs   
-    
\ No newline at end of file
+    with open(argv[1]) as inf: parser.parse(inf)
+    if len(argv) > 2:
+        # stream into <prefix>.structs.c and <prefix>.funcs.c, or when
+        # size-capped into <prefix>.structs.N.c and <prefix>.funcs.N.c
+        maxBytes = 0
+        if len(argv) > 3:
+            maxBytes = int(argv[3])
+        seq = ''
+        if maxBytes:
+            seq = '.%d'
+        reset(util.FileSink(argv[2] + '.structs' + seq + '.c', maxBytes),
+              util.FileSink(argv[2] + '.funcs' + seq + '.c', maxBytes))
+        process(parser.getResults())
+        structs.close()
+        funcs.close()
+    else:
+        process(parser.getResults())
+        print structs
+        print funcs
+
+
+if __name__ == '__main__':
+    stats.run(main, sys.argv)
@@ -0,0 +1,315 @@
+"""
+Header-to-bindings pipeline driver. Runs c2json over many headers concurrently
+in a process pool, then parses each result and feeds it straight into the
+selected writers, without the intermediate shell plumbing.
+
+c2json output is cached on disk, keyed by a hash of the header's content, the
+content of every include that can be resolved through the compiler flags, the
+compiler flags themselves and the c2json executable (its resolved path, size
+and modification time). Headers whose key is unchanged skip clang entirely.
+
+With --merge, the translation units are merged into a single registry (decls
+shared through common includes are only registered once) and one set of
+bindings is generated. Conflicting redefinitions are reported on stderr.
+
+With --allow/--deny, only the selected functions and the structs, enums and
+aliases they reach are generated (see graph.prune).
+
+usage:
+    python pipeline.py [options] header.h [header.h ...] [-- compiler flags]
+"""
+
+import os
+import re
+import sys
+import json
+import errno
+import hashlib
+import argparse
+import subprocess
+import multiprocessing
+from distutils.spawn import find_executable
+sys.path.append('../') # permit access to parent directory modules
+from pycjson import parser, graph, stats
+
+# file extension of each writer's output
+extensions = {
+    'pywriter': '.py',
+    'cwriter':  '.c',
+}
+
+includePattern = re.compile(r'^\s*#\s*include\s*([<"])([^>"]+)[>"]', re.MULTILINE)
+
+
+#
+# cache keys
+#
+
+def includeDirsForFlags(flags):
+    """
+    the include search path given by the compiler flags
+    """
+    dirs = []
+    flags = list(flags)
+    for (i, flag) in enumerate(flags):
+        for opt in ('-I', '-isystem', '-iquote'):
+            if flag == opt and i + 1 < len(flags):
+                dirs.append(flags[i + 1])
+            elif flag.startswith(opt) and len(flag) > len(opt):
+                dirs.append(flag[len(opt):])
+    return dirs
+
+
+def findIncludes(path, includeDirs):
+    """
+    returns the paths of all files (transitively) included by path that can be
+    found on the include path. Includes that can't be resolved (i.e. system
+    headers) are ignored
+    """
+    found = []
+    seen = set([os.path.abspath(path)])
+    pending = [path]
+    while len(pending):
+        cur = pending.pop(0)
+        with open(cur) as inf:
+            text = inf.read()
+        for (delim, name) in includePattern.findall(text):
+            dirs = includeDirs
+            if delim == '"':
+                dirs = [os.path.dirname(cur)] + includeDirs
+            for d in dirs:
+                candidate = os.path.abspath(os.path.join(d, name))
+                if os.path.isfile(candidate):
+                    if candidate not in seen:
+                        seen.add(candidate)
+                        found.append(candidate)
+                        pending.append(candidate)
+                    break
+    return found
+
+
+def resolveC2Json(c2json):
+    """
+    absolute path of the c2json executable, looking bare names up in PATH
+    """
+    if os.path.dirname(c2json):
+        path = c2json
+    else:
+        path = find_executable(c2json)
+    if not path or not os.path.isfile(path):
+        raise ValueError('c2json executable not found: %s' % c2json)
+    return os.path.abspath(path)
+
+
+def cacheKey(c2json, header, flags):
+    """
+    hash of everything that influences the c2json output for header. c2json
+    is the resolved executable (see resolveC2Json)
+    """
+    h = hashlib.sha1()
+    st = os.stat(c2json)
+    h.update('%s\0%d:%r\0' % (c2json, st.st_size, st.st_mtime))
+    h.update('\0'.join(flags) + '\0')
+    for path in [header] + findIncludes(header, includeDirsForFlags(flags)):
+        with open(path) as inf:
+            h.update(path + '\0' + inf.read() + '\0')
+    return h.hexdigest()
+
+
+#
+# c2json
+#
+
+def runC2Json(job):
+    """
+    pool entry point. Returns the (json text, cache hit) for a header
+    """
+    (c2json, header, flags, cacheDir) = job
+    cached = None
+    if cacheDir:
+        with stats.timed('pipeline.cacheKey'):
+            key = cacheKey(c2json, header, flags)
+        cached = os.path.join(cacheDir, key + '.json')
+        if os.path.isfile(cached):
+            with open(cached) as inf:
+                return (inf.read(), True)
+
+    with stats.timed('pipeline.clang'):
+        text = subprocess.check_output([c2json, header, '--'] + list(flags))
+
+    if cached:
+        # write then rename, so concurrent runs never see a partial file
+        tmp = '%s.%d' % (cached, os.getpid())
+        with open(tmp, 'w') as outf:
+            outf.write(text)
+        os.rename(tmp, cached)
+    return (text, False)
+
+
+def _collectC2Json(job):
+    """
+    pool entry point, also returns the statistics recorded by the worker
+    """
+    return stats.collect(runC2Json, job)
+
+
+def translate(headers, flags=(), c2json='c2json', cacheDir=None, jobs=None):
+    """
+    run c2json over the headers in a process pool. Returns a list of
+    (json text, cache hit) in the order of headers
+    """
+    if cacheDir:
+        try:
+            os.makedirs(cacheDir)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+    c2json = resolveC2Json(c2json)
+    work = [(c2json, h, tuple(flags), cacheDir) for h in headers]
+    if len(work) <= 1:
+        return [runC2Json(w) for w in work]
+    pool = multiprocessing.Pool(min(jobs or multiprocessing.cpu_count(), len(work)))
+    try:
+        return stats.mergeResults(pool.map(_collectC2Json, work))
+    finally:
+        pool.close()
+        pool.join()
+
+
+#
+# code generation
+#
+
+def outputBases(headers):
+    """
+    the output name (without extension) of each header: its path relative to
+    the deepest directory holding all of the headers, so that headers sharing
+    a basename in different directories don't overwrite each other's output
+    """
+    paths = [os.path.abspath(h) for h in headers]
+    dirs = [os.path.dirname(p).split(os.sep) for p in paths]
+    root = dirs[0]
+    for d in dirs[1:]:
+        n = 0
+        while n < min(len(root), len(d)) and root[n] == d[n]:
+            n += 1
+        root = root[:n]
+    root = os.sep.join(root) or os.sep
+    bases = [os.path.splitext(os.path.relpath(p, root))[0] for p in paths]
+    seen = {}
+    for (header, base) in zip(headers, bases):
+        if seen.has_key(base):
+            raise ValueError('%s and %s both generate %s'
+                             % (seen[base], header, base))
+        seen[base] = header
+    return bases
+
+
+def generate(decls, writerNames, allow=None, deny=None):
+    """
+    run the decls through the writers, limited to the functions selected by
+    allow/deny (see graph.prune). Returns a list of generated sources in the
+    order of writerNames
+    """
+    graph.allow = allow
+    graph.deny = deny
+    results = []
+    for name in writerNames:
+        writer = __import__(name)
+        writer.reset()
+        writer.process(decls)
+        results.append(str(writer.structs) + '\n' + str(writer.funcs) + '\n')
+    return results
+
+
+def writeOutputs(outDir, base, decls, writerNames, allow=None, deny=None):
+    """
+    write the bindings for decls into outDir as <base><writer-extension>
+    """
+    subDir = os.path.dirname(os.path.join(outDir, base))
+    if not os.path.isdir(subDir):
+        os.makedirs(subDir)
+    for (name, src) in zip(writerNames, generate(decls, writerNames, allow, deny)):
+        with open(os.path.join(outDir, base + extensions[name]), 'w') as outf:
+            outf.write(src)
+
+
+def run(headers, outDir, writerNames=('pywriter',), flags=(),
+        c2json='c2json', cacheDir=None, jobs=None, merge=None,
+        allow=None, deny=None):
+    """
+    translate the headers and write the generated bindings into outDir as
+    <header-path><writer-extension> (see outputBases), or as
+    <merge><writer-extension> when merging all headers into one registry. Only
+    the functions selected by allow/deny and the types they reach are
+    generated. Returns the number of cache hits and the list of conflicts
+    found while merging
+    """
+    if not merge:
+        bases = outputBases(headers)
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    with stats.timed('pipeline.c2json'):
+        translated = translate(headers, flags, c2json, cacheDir, jobs)
+    hits = sum([hit for (_, hit) in translated])
+    if stats.enabled:
+        for (_, hit) in translated:
+            stats.hit('pipeline.cache', hit)
+    if merge:
+        parser.reset()
+        decls = parser.parseBatch([text for (text, _) in translated])
+        writeOutputs(outDir, merge, decls, writerNames, allow, deny)
+        return hits, parser.getConflicts()
+
+    for (base, (text, hit)) in zip(bases, translated):
+        parser.reset()
+        decls = parser.parseRecords(json.loads(text))
+        writeOutputs(outDir, base, decls, writerNames, allow, deny)
+    return hits, []
+
+
+def main(argv):
+    """
+    command line entry point
+    """
+    argv = argv[1:]
+    flags = []
+    if '--' in argv:
+        flags = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+
+    ap = argparse.ArgumentParser(description='generate bindings for headers')
+    ap.add_argument('headers', nargs='+')
+    ap.add_argument('-o', '--output', default='.', help='output directory')
+    ap.add_argument('-w', '--writer', action='append', choices=sorted(extensions),
+                    help='writer to run (may be repeated, default pywriter)')
+    ap.add_argument('-j', '--jobs', type=int, help='worker processes')
+    ap.add_argument('--c2json', default='c2json', help='c2json executable')
+    ap.add_argument('--cache', default='.c2json-cache',
+                    help='cache directory ("" disables the cache)')
+    ap.add_argument('--merge', metavar='NAME',
+                    help='merge all headers into one set of bindings NAME.*')
+    ap.add_argument('--allow', metavar='PATTERN', action='append',
+                    help='only generate the functions matching PATTERN and the '
+                         'types they use (may be repeated, fnmatch style)')
+    ap.add_argument('--deny', metavar='PATTERN', action='append',
+                    help='skip the functions matching PATTERN (may be repeated)')
+    args = ap.parse_args(argv)
+
+    try:
+        hits, conflicts = run(args.headers, args.output,
+                              args.writer or ['pywriter'], flags, args.c2json,
+                              args.cache, args.jobs, args.merge,
+                              args.allow, args.deny)
+    except ValueError, e:
+        ap.error(str(e))
+    sys.stderr.write('%d/%d headers from cache\n' % (hits, len(args.headers)))
+    for (ident, first, unit) in conflicts:
+        sys.stderr.write('conflicting definition of %s in %s (first defined in %s)\n'
+                         % (ident, args.headers[unit], args.headers[first]))
+    if len(conflicts):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    stats.run(main, sys.argv)
@@ -0,0 +1,141 @@
+"""
+Runtime metrics for the pywriter generated bindings. When pywriter.metrics is
+set, every generated ApiBase method times its encode, _invoke and decode
+steps and reports them, together with the request and response sizes, to
+the sink in the ApiBase._metrics attribute (nothing is recorded while it is
+None). Sinks derive from MetricsSink.
+
+HistogramSink is the reference sink. It keeps call counts, total encode and
+decode times, byte counts and an _invoke latency histogram per method. The
+histograms have fixed bucket bounds and are allocated up front, so recording
+a call never allocates. Recording is serialized by a lock, so a sink can be
+shared by ApiBase instances (or an instance) used from several threads.
+"""
+
+import threading
+from bisect import bisect_left
+
+# default histogram bucket upper bounds, in seconds (10us .. 10s). Values
+# larger than the last bound land in an overflow bucket
+defaultBounds = (
+    1e-5, 2.5e-5, 5e-5,
+    1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3,
+    1e-2, 2.5e-2, 5e-2,
+    1e-1, 2.5e-1, 5e-1,
+    1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    fixed bucket histogram. counts[i] is the number of values <= bounds[i]
+    (and > bounds[i - 1]), counts[-1] the number of values > bounds[-1]
+    """
+    def __init__(self, bounds=defaultBounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+
+    def add(self, v):
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.total += v
+
+    def count(self):
+        return sum(self.counts)
+
+    def percentile(self, p):
+        """
+        the upper bound of the bucket holding the p-th percentile (None when
+        it lies in the overflow bucket)
+        """
+        n = self.count()
+        if n == 0:
+            return 0.0
+        rank = p * n
+        seen = 0
+        for (i, c) in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                if i < len(self.bounds):
+                    return self.bounds[i]
+                return None
+        return None
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.total = 0.0
+
+
+class MethodMetrics:
+    """
+    metrics of a single ApiBase method
+    """
+    def __init__(self, bounds=defaultBounds):
+        self.calls = 0
+        self.encodeTime = 0.0
+        self.decodeTime = 0.0
+        self.bytesOut = 0
+        self.bytesIn = 0
+        self.latency = Histogram(bounds)
+
+    def report(self):
+        return {'calls':        self.calls,
+                'encodeTime':   self.encodeTime,
+                'decodeTime':   self.decodeTime,
+                'invokeTime':   self.latency.total,
+                'bytesOut':     self.bytesOut,
+                'bytesIn':      self.bytesIn,
+                'latencyBounds': list(self.latency.bounds),
+                'latencyCounts': list(self.latency.counts)}
+
+
+class MetricsSink:
+    """
+    interface implemented by all sinks
+    """
+    def record(self, method, encodeTime, invokeTime, decodeTime, bytesOut, bytesIn):
+        """
+        called once per completed call. method is the FunId of the call,
+        times are in seconds
+        """
+        raise NotImplementedError()
+
+
+class HistogramSink(MetricsSink):
+    """
+    accumulates MethodMetrics per method. Pass the FunIds of the methods that
+    will be called to allocate all metrics up front; other methods get their
+    metrics allocated on their first call
+    """
+    def __init__(self, methods=(), bounds=defaultBounds):
+        self.bounds = bounds
+        self.lock = threading.Lock()
+        self.methods = {}
+        for m in methods:
+            self.methods[m] = MethodMetrics(bounds)
+
+    def record(self, method, encodeTime, invokeTime, decodeTime, bytesOut, bytesIn):
+        with self.lock:
+            m = self.methods.get(method)
+            if m is None:
+                m = self.methods[method] = MethodMetrics(self.bounds)
+            m.calls += 1
+            m.encodeTime += encodeTime
+            m.decodeTime += decodeTime
+            m.bytesOut += bytesOut
+            m.bytesIn += bytesIn
+            m.latency.add(invokeTime)
+
+    def report(self, names=None):
+        """
+        json compatible dict of the metrics, keyed by FunId (or by names[FunId]
+        when a mapping of names is given)
+        """
+        result = {}
+        with self.lock:
+            for (method, m) in self.methods.items():
+                if names is not None:
+                    method = names.get(method, method)
+                result[str(method)] = m.report()
+        return result
@@ -0,0 +1,316 @@
+"""
+Stream objects used by the pywriter generated bindings. Clients that want their
+own serialization scheme derive from AbstractStream. BinaryStream is the
+reference serializer; it uses the same wire format as CNativeStream (fields
+packed back-to-back in native byte order, strings NUL terminated), so bytes
+encoded by the Python bindings can be decoded by the cwriter generated code and
+vice versa.
+
+Strings decoded by BinaryStream are str by default. With lazyStrings set they
+are LazyString objects instead, which reference the received bytes and only
+build a str when one is needed. Passing a LazyString back into a stream copies
+the referenced bytes directly.
+
+Strings may optionally be sent length-prefixed (<length u32><bytes><NUL>),
+matching cwriter.StringWireLength, which spares the decoder the NUL scan.
+"""
+
+import ctypes
+import struct
+
+# initial buffer size of output streams
+InitialCapacity = 256
+
+# length prefix of the length-prefixed string wire format
+stringLength = struct.Struct('=I')
+
+# (method suffix, struct format) of the scalar types. The suffixes match the
+# normalized builtin type names used by pywriter (i.e. uint32_t -> Uint32)
+scalarFormats = (
+    ('Char',   'b'),
+    ('Int8',   'b'),
+    ('Uint8',  'B'),
+    ('Int16',  'h'),
+    ('Uint16', 'H'),
+    ('Int32',  'i'),
+    ('Uint32', 'I'),
+    ('Int64',  'q'),
+    ('Uint64', 'Q'),
+    ('Float',  'f'),
+    ('Double', 'd'))
+
+
+class LazyString(object):
+    """
+    string backed by a memoryview slice of a stream's buffer. Compares, hashes
+    and behaves like a str, but the str is only built on first use. It is not a
+    str subclass though, so code that type checks its values (i.e. json.dumps)
+    needs str(v)
+    """
+    __slots__ = ('view', 'value')
+
+    def __init__(self, view):
+        self.view = view
+        self.value = None
+
+    def __str__(self):
+        if self.value is None:
+            self.value = self.view.tobytes()
+        return self.value
+
+    def __len__(self):
+        return len(self.view)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyString):
+            other = other.view
+        elif isinstance(other, unicode):
+            return str(self) == other
+        return self.view == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __cmp__(self, other):
+        if isinstance(other, LazyString):
+            other = str(other)
+        return cmp(str(self), other)
+
+    def __add__(self, other):
+        if isinstance(other, LazyString):
+            other = str(other)
+        return str(self) + other
+
+    def __radd__(self, other):
+        return other + str(self)
+
+    def __getitem__(self, i):
+        return str(self)[i]
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def __contains__(self, v):
+        if isinstance(v, LazyString):
+            v = str(v)
+        return v in str(self)
+
+    def __unicode__(self):
+        return unicode(str(self))
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __getattr__(self, name):
+        # anything else is handled by the materialized str
+        return getattr(str(self), name)
+
+
+class AbstractStream:
+    """
+    interface implemented by all streams. Besides the methods below a stream
+    provides put<Type>(v) and get<Type>() for every type in scalarFormats
+    """
+    def putCString(self, v):
+        raise NotImplementedError()
+
+    def getCString(self):
+        raise NotImplementedError()
+
+    def putBytes(self, v):
+        raise NotImplementedError()
+
+    def getBytes(self, n):
+        raise NotImplementedError()
+
+    def size(self):
+        """
+        number of bytes in the stream (used by the generated metrics code)
+        """
+        raise NotImplementedError()
+
+    def reset(self):
+        """
+        empty the stream so that it can be reused (used by stream pooling)
+        """
+        raise NotImplementedError()
+
+    def capacity(self):
+        """
+        the memory held by the stream in bytes (used by stream pooling)
+        """
+        raise NotImplementedError()
+
+    def putLayout(self, v):
+        """
+        encode a ctypes object (i.e. a pywriter generated layout)
+        """
+        raise NotImplementedError()
+
+    def getLayout(self, cls):
+        """
+        decode an instance of the ctypes type cls
+        """
+        raise NotImplementedError()
+
+
+class BinaryStream(AbstractStream):
+    """
+    reference binary serializer. Output streams are created empty, input
+    streams are created from the received bytes. With lazyStrings set, decoded
+    strings are LazyStrings referencing the input buffer, so such an input
+    stream must not be written to
+
+    The buffer keeps its capacity when the stream is reset, so a reused stream
+    encodes without reallocating. Only buf[:used] holds data
+    """
+    def __init__(self, data='', lengthPrefixed=False, lazyStrings=False):
+        if data:
+            self.buf = bytearray(data)
+            self.used = len(self.buf)
+        else:
+            self.buf = bytearray(InitialCapacity)
+            self.used = 0
+        self.cur = 0
+        self.view = None
+        self.lengthPrefixed = lengthPrefixed
+        self.lazyStrings = lazyStrings
+
+    def reset(self):
+        """
+        empty the stream for reuse, keeping its buffer
+        """
+        self.used = 0
+        self.cur = 0
+        self.view = None
+
+    def capacity(self):
+        """
+        the size of the buffer (in bytes)
+        """
+        return len(self.buf)
+
+    def _grow(self, end):
+        """
+        grow the buffer to hold at least end bytes
+        """
+        grow = max(end, 2 * len(self.buf)) - len(self.buf)
+        try:
+            self.buf.extend(bytearray(grow))
+        except BufferError:
+            # strings decoded from the stream still reference the buffer,
+            # leave it to them
+            self.buf = self.buf[:self.used] \
+                           + bytearray(grow + len(self.buf) - self.used)
+
+    def _reserve(self, n):
+        """
+        append room for n bytes, returns the offset of the room
+        """
+        start = self.used
+        end = start + n
+        if end > len(self.buf):
+            self._grow(end)
+        self.used = end
+        return start
+
+    def getvalue(self):
+        """
+        the encoded bytes
+        """
+        return str(buffer(self.buf, 0, self.used))
+
+    def size(self):
+        return self.used
+
+    def putBytes(self, v):
+        start = self._reserve(len(v))
+        self.buf[start:self.used] = v
+
+    def getBytes(self, n):
+        if self.cur + n > self.used:
+            raise EOFError('stream underflow')
+        v = self.buf[self.cur:self.cur + n]
+        self.cur += n
+        return v
+
+    def putLayout(self, v):
+        # a layout's memory is its wire format
+        start = self._reserve(ctypes.sizeof(v))
+        self.buf[start:self.used] = buffer(v)
+
+    def getLayout(self, cls):
+        # the result references the stream's buffer, nothing is copied
+        n = ctypes.sizeof(cls)
+        if self.cur + n > self.used:
+            raise EOFError('stream underflow')
+        v = cls.from_buffer(self.buf, self.cur)
+        self.cur += n
+        return v
+
+    def putCString(self, v):
+        if isinstance(v, LazyString):
+            v = v.view
+        n = len(v)
+        if self.lengthPrefixed:
+            stringLength.pack_into(self.buf, self._reserve(stringLength.size), n)
+        start = self._reserve(n + 1)
+        self.buf[start:start + n] = v
+        self.buf[start + n] = 0
+
+    def getCString(self):
+        if self.lengthPrefixed:
+            if self.cur + stringLength.size > self.used:
+                raise EOFError('stream underflow')
+            (n,) = stringLength.unpack_from(self.buf, self.cur)
+            start = self.cur + stringLength.size
+            end = start + n
+            if end >= self.used:
+                raise EOFError('stream underflow')
+        else:
+            start = self.cur
+            try:
+                end = self.buf.index('\0', start, self.used)
+            except ValueError:
+                raise EOFError('unterminated string')
+        self.cur = end + 1
+        if not self.lazyStrings:
+            return str(buffer(self.buf, start, end - start))
+        if self.view is None:
+            self.view = memoryview(self.buf)
+        return LazyString(self.view[start:end])
+
+
+def _scalarCoders(fmt):
+    """
+    create the put/get methods for a scalar format
+    """
+    packer = struct.Struct('=' + fmt)
+    size = packer.size
+
+    def put(self, v):
+        # _reserve inlined, this is the hot path
+        start = self.used
+        end = start + size
+        if end > len(self.buf):
+            self._grow(end)
+        packer.pack_into(self.buf, start, v)
+        self.used = end
+
+    def get(self):
+        if self.cur + size > self.used:
+            raise EOFError('stream underflow')
+        (v,) = packer.unpack_from(self.buf, self.cur)
+        self.cur += size
+        return v
+
+    return put, get
+
+
+for (name, fmt) in scalarFormats:
+    (put, get) = _scalarCoders(fmt)
+    setattr(BinaryStream, 'put' + name, put)
+    setattr(BinaryStream, 'get' + name, get)
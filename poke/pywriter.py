@@ -21,7 +21,7 @@ same thing and have large communities of active users.
 
 import sys
 sys.path.append('../') # permit access to parent directory modules
-from pycjson import util, parser, sugar
+from pycjson import util, parser, sugar, stats, graph
 
 #
 # normalization transforms to be applied (these can be overriden by clients)
@@ -31,12 +31,44 @@ normallizeFunc = util.camelize
 normalizeField = util.downCamelize
 normalizeType  = util.camelize
 
+# generate runtime metrics hooks into the ApiBase methods (see pymetrics)
+metrics = False
+
+# generate a lazily materializing module: the structs and ApiBase methods are
+# stored as source chunks, and only compiled when first accessed
+lazy = False
+
+# borrow the request streams of the ApiBase methods from per-thread pools
+# instead of creating a stream per call (streams must implement reset and
+# capacity, and _invoke must not return the request stream)
+pooled = False
+
+# generate ctypes.Structure mirrors (<Struct>Layout) of the fixed-layout
+# structs, i.e. those made of scalars, enums (as int32), arrays and other
+# fixed-layout structs. Struct results of the ApiBase methods are then decoded
+# in place with stream.getLayout, and layouts can be passed wherever a struct
+# is encoded
+layouts = False
+
+# ctypes type of each builtin that can be part of a layout
+layoutTypes = {
+    'char':     'ctypes.c_int8',
+    'int8_t':   'ctypes.c_int8',
+    'uint8_t':  'ctypes.c_uint8',
+    'int16_t':  'ctypes.c_int16',
+    'uint16_t': 'ctypes.c_uint16',
+    'int32_t':  'ctypes.c_int32',
+    'uint32_t': 'ctypes.c_uint32',
+    'int64_t':  'ctypes.c_int64',
+    'uint64_t': 'ctypes.c_uint64',
+    'float':    'ctypes.c_float',
+    'double':   'ctypes.c_double',
+}
+
 #
 # create some buffers objects to hold the output
 #
 
-structs = util.OutputBuffer()
-funcs = util.OutputBuffer()
 funcHeader = \
 """
 class ApiBase:
@@ -49,17 +81,76 @@ class ApiBase:
     def _invoke(method):
         pass
 """
-funcs.writeln(funcHeader)
-funcs.incIndent()
- 
- # type declarations already encountered
-declsSeen = {}
-  
-#
-# struct encoder 
-#
+metricsFuncHeader = \
+"""
+from timeit import default_timer as _clock
+
+
+class ApiBase:
+    # metrics sink (see pymetrics.MetricsSink), None disables recording
+    _metrics = None
+
+    def __init__(self):
+        pass
     
-structs.writeln("""
+    def _createOstream(self):
+        pass
+        
+    def _invoke(method):
+        pass
+"""
+# prepended/appended to the ApiBase header when pooling streams. Streams are
+# pooled per thread and per ApiBase subclass (so all instances of a class must
+# create equivalent streams), in free lists by capacity. Streams larger than
+# the last size class are dropped rather than pooled
+pooledFuncPrologue = \
+"""
+import threading
+
+# per-thread free lists of request streams
+_streamPools = threading.local()
+"""
+pooledFuncHook = \
+"""
+    # capacity upper bound of each free list's size class, and the maximum
+    # number of streams each free list holds
+    _poolSizeClasses = (256, 4096, 65536)
+    _poolLimit = 16
+
+    def _borrowOstream(self, size=0):
+        # borrow from the smallest size class that holds size bytes, falling
+        # back to larger ones
+        pools = _streamPools.__dict__.get(self.__class__)
+        if pools is None:
+            pools = [[] for c in self._poolSizeClasses]
+            _streamPools.__dict__[self.__class__] = pools
+        for (limit, free) in zip(self._poolSizeClasses, pools):
+            if (limit >= size) and len(free):
+                return free.pop()
+        return self._createOstream()
+
+    def _returnOstream(self, s):
+        capacity = s.capacity()
+        pools = _streamPools.__dict__[self.__class__]
+        for (limit, free) in zip(self._poolSizeClasses, pools):
+            if capacity <= limit:
+                if len(free) < self._poolLimit:
+                    s.reset()
+                    free.append(s)
+                return
+"""
+# appended to the ApiBase header in lazy mode
+lazyFuncHook = \
+"""
+    def __getattr__(self, name):
+        # methods are compiled on first access
+        if not _methods.has_key(name):
+            raise AttributeError(name)
+        _materializeMethod(ApiBase, name)
+        return getattr(self, name)
+"""
+structHeader = \
+"""
 def codeArray(subs, arr, coder):
     count = subs[0]
     if len(subs) == 1:
@@ -68,14 +159,293 @@ def codeArray(subs, arr, coder):
             coder(arr[i])
     else:
         subs = subs[1:]
-        arr  = arr[1:]
         for i in range(count):
             # encode dimension K + 1
-            codeArray(subs, arr, coder)
+            codeArray(subs, arr[i], coder)
+
+
+def makeArray(subs, factory):
+    count = subs[0]
+    if len(subs) == 1:
+        # base case
+        return [factory() for i in range(count)]
+    # create dimension K + 1
+    return [makeArray(subs[1:], factory) for i in range(count)]
+
+
+class EnumValue(int):
+    # decoded enum value, an int whose repr is the name of its constant
+    __slots__ = ()
+    names = {}
+
+    def __repr__(self):
+        return self.names.get(self, int.__repr__(self))
+
+    def __reduce__(self):
+        return (self.__class__, (int(self),))
             
-""")
+"""
 
-    
+# appended to the struct header in lazy mode. When the generated code is
+# imported the module replaces itself in sys.modules with a _LazyModule that
+# compiles structs on attribute access. When it is exec'd into a namespace
+# instead, structs must be obtained through _materialize(name)
+lazyStructHeader = \
+"""
+import sys
+import types
+
+# source of the lazily compiled structs and ApiBase methods, along with the
+# names of the structs each one references
+_chunks = {}
+_deps = {}
+_methods = {}
+_methodDeps = {}
+
+
+def _materialize(name):
+    \"\"\"
+    compile the struct name and the structs it references, returns the struct
+    \"\"\"
+    g = globals()
+    pending = [name]
+    while len(pending):
+        n = pending.pop()
+        if not g.has_key(n):
+            exec compile(_chunks[n], '<' + n + '>', 'exec') in g
+            pending.extend(_deps[n])
+    return g[name]
+
+
+def _materializeMethod(cls, name):
+    \"\"\"
+    compile the ApiBase method name and bind it to cls
+    \"\"\"
+    for dep in _methodDeps[name]:
+        _materialize(dep)
+    ns = {}
+    exec compile(_methods[name], '<' + name + '>', 'exec') in globals(), ns
+    setattr(cls, name, ns[name])
+
+
+class _LazyModule(types.ModuleType):
+    \"\"\"
+    stands in for the generated module, compiling structs on first access
+    \"\"\"
+    def __init__(self, module):
+        types.ModuleType.__init__(self, module.__name__, module.__doc__)
+        # keeps the module (and with it the namespace) alive
+        self.__dict__['_module'] = module
+
+    def __getattr__(self, name):
+        g = self._module.__dict__
+        if g.has_key(name):
+            return g[name]
+        if _chunks.has_key(name):
+            return _materialize(name)
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        setattr(self._module, name, value)
+
+
+if sys.modules.has_key(__name__) \\
+        and (sys.modules[__name__].__dict__ is globals()):
+    sys.modules[__name__] = _LazyModule(sys.modules[__name__])
+
+"""
+
+# written ahead of the layouts
+layoutStructHeader = \
+"""
+import ctypes
+"""
+
+structs = None
+funcs = None
+
+ # type declarations already encountered
+declsSeen = None
+
+# struct decl -> true if it has a fixed layout
+fixedLayouts = None
+
+# struct decl -> minimum encoded size (see minWireSize)
+wireSizes = None
+
+
+def reset(structsSink=None, funcsSink=None):
+    """
+    reset the writer to its initial state. The generated code is streamed into
+    the given sinks (in-memory buffers by default)
+    """
+    global structs, funcs, declsSeen, fixedLayouts, wireSizes
+    structs = util.OutputBuffer(sink=structsSink)
+    funcs = util.OutputBuffer(sink=funcsSink)
+    declsSeen = {}
+    fixedLayouts = {}
+    wireSizes = {}
+    structs.writeln(structHeader)
+    if layouts:
+        structs.writeln(layoutStructHeader)
+    header = funcHeader
+    if metrics:
+        header = metricsFuncHeader
+    if pooled:
+        header = pooledFuncPrologue + header + pooledFuncHook
+    if lazy:
+        # the chunk tables are written at module level
+        structs.writeln(lazyStructHeader)
+        funcs.writeln(header + lazyFuncHook)
+    else:
+        funcs.writeln(header)
+        funcs.incIndent()
+
+
+# initialize the output buffers
+reset()
+
+  
+#
+# lazy mode chunks
+#
+
+def structDeps(infos):
+    """
+    the names of the structs referenced by the VarInfos
+    """
+    deps = set()
+    for info in infos:
+        rt = util.resolveDecl(info.declType)
+        if rt.kind == sugar.KindStruct:
+            deps.add(normalizeType(rt.identifier))
+    return sorted(deps)
+
+
+def writeChunk(out, table, depTable, name, code, deps):
+    """
+    write the source chunk of a lazily compiled name into its table
+    """
+    name = str(name)
+    out.writeln(table, '[', repr(name), '] = ', repr(code))
+    out.writeln(depTable, '[', repr(name), '] = ',
+                repr(tuple([str(d) for d in deps])))
+    out.boundary()
+
+
+#
+# ctypes layouts
+#
+
+def layoutNameForType(t):
+    return normalizeType(t.identifier) + 'Layout'
+
+
+def hasFixedLayout(info):
+    """
+    true if values of the VarInfo's type can be part of a layout
+    """
+    if info.hasQual():
+        # pointers (and strings)
+        return False
+    rt = util.resolveDecl(info.declType)
+    if rt.kind == sugar.KindStruct:
+        return isFixedLayout(rt)
+    if rt.kind == sugar.KindEnum:
+        # enums travel as int32
+        return True
+    return layoutTypes.has_key(rt.identifier)
+
+
+def isFixedLayout(t):
+    """
+    true if the struct t has a fixed wire layout
+    """
+    if not fixedLayouts.has_key(t):
+        # a struct can only contain itself through a pointer
+        fixedLayouts[t] = False
+        fixedLayouts[t] = len(t.fields) != 0 \
+                              and all([hasFixedLayout(f.typeInfo) for f in t.fields])
+    return fixedLayouts[t]
+
+
+def minWireSize(info):
+    """
+    lower bound of the encoded size of a value of the VarInfo's type (strings
+    count as their terminator only)
+    """
+    count = 1
+    for n in info.subscripts:
+        count *= n
+    if info.isString():
+        return count
+    rt = util.resolveDecl(info.declType)
+    if rt.kind == sugar.KindStruct:
+        if not wireSizes.has_key(rt):
+            # a struct can only contain itself through a pointer
+            wireSizes[rt] = 0
+            wireSizes[rt] = sum([minWireSize(f.typeInfo) for f in rt.fields])
+        return count * wireSizes[rt]
+    if rt.kind == sugar.KindEnum:
+        return count * 4
+    return count * rt.width
+
+
+def layoutType(info):
+    """
+    the ctypes type of a field of a layout (i.e. SayingLayout * 2 * 10 for
+    saying_t[10][2])
+    """
+    rt = util.resolveDecl(info.declType)
+    if rt.kind == sugar.KindStruct:
+        name = layoutNameForType(rt)
+    elif rt.kind == sugar.KindEnum:
+        name = 'ctypes.c_int32'
+    else:
+        name = layoutTypes[rt.identifier]
+    for n in reversed(info.subscripts):
+        name += ' * ' + str(n)
+    return name
+
+
+def writeLayout(t):
+    """
+    write the ctypes mirror of the fixed-layout struct t. The mirror is packed,
+    so its memory is the struct's wire format
+    """
+    name = layoutNameForType(t)
+    out = structs
+    if lazy:
+        out = util.OutputBuffer()
+    out.writeln('class ', name, '(ctypes.Structure):')
+    out.incIndent()
+    out.writeln('_pack_ = 1')
+    out.writeln('_fields_ = [')
+    out.incIndent()
+    for f in t.fields:
+        out.writeln("('", normalizeField(f.identifier), "', ",
+                    layoutType(f.typeInfo), '),')
+    out.decIndent()
+    out.writeln(']')
+    out.writeln()
+    out.writeln('def writeToStream(self, s):')
+    out.incIndent()
+    out.writeln('s.putLayout(self)')
+    out.decIndent(2)
+    out.write('\n\n')
+    out.boundary()
+    if lazy:
+        deps = set()
+        for f in t.fields:
+            rt = util.resolveDecl(f.typeInfo.declType)
+            if rt.kind == sugar.KindStruct:
+                deps.add(layoutNameForType(rt))
+        writeChunk(structs, '_chunks', '_deps', name, str(out), sorted(deps))
+
+
+#
+# struct encoder 
+#
     
 def writeArrayEncoder(out, f, pre):
     """
@@ -87,20 +457,21 @@ def writeArrayEncoder(out, f, pre):
     # select the encoder 
     coder = ''
     if rt.kind == sugar.KindStruct:
-        coder = 'lambda obj: obj.writeToStream(s))'
-    if f.typeInfo.isString():
-        coder = 'lambda obj: s.putCString(obj)'
+        coder = 'lambda obj: obj.writeToStream(s)'
+    elif f.typeInfo.isString():
+        coder = 's.putCString'
     else:
-        coder = 'lambda obj: s.put' +  normalize(rt.identifier) + '(obj)'
+        coder = 's.put' +  coderSuffix(rt)
     
     # perform the encoding 
     out.writeln('codeArray(',
+                    str(tuple(f.typeInfo.subscripts)),
+                    ', ',
                     pre,
                     normalizeField(f.identifier),
                     ', ',
-                    str(tuple(f.typeInfo.subscripts)),
-                    ', ',
-                    coder)
+                    coder,
+                    ')')
         
     
 def writeFieldEncoder(buf, f, pre):
@@ -111,13 +482,13 @@ def writeFieldEncoder(buf, f, pre):
     rt = util.resolveDecl(t)
     if f.typeInfo.isArray():
         writeArrayEncoder(buf, f, pre)
-    if rt.kind == sugar.KindStruct:
+    elif rt.kind == sugar.KindStruct:
         buf.writeln(pre, normalizeField(f.identifier), '.writeToStream(s)')
     elif f.typeInfo.isString():
         buf.writeln('s.putCString(', pre, normalizeField(f.identifier), ')')
     else:
         buf.writeln('s.put',
-                    normalize(rt.identifier),
+                    coderSuffix(rt),
                     '(',
                     pre,
                     normalizeField(f.identifier),
@@ -140,10 +511,42 @@ def writeEncoder(out, t):
 # struct decoer
 #
 
+def valueDecoder(f):
+    """
+    returns an expression that decodes a new value of the field's type
+    """
+    rt = util.resolveDecl(f.typeInfo.declType)
+    if rt.kind == sugar.KindStruct:
+        return normalizeType(rt.identifier) + '(s)'
+    elif f.typeInfo.isString():
+        return 's.getCString()'
+    elif rt.kind == sugar.KindEnum:
+        return enumNameForType(rt) + '(s.getInt32())'
+    return 's.get' + normalize(rt.identifier) + '()'
+
+
+def resultDecoder(f):
+    """
+    returns an expression that decodes a result of an ApiBase method
+    """
+    rt = util.resolveDecl(f.typeInfo.declType)
+    if layouts and (rt.kind == sugar.KindStruct) and isFixedLayout(rt):
+        # decoded in place
+        return 's.getLayout(' + layoutNameForType(rt) + ')'
+    return valueDecoder(f)
+
+
 def writeArrayDecoder(out, f, pre):
     """
     handle decoding an array
     """
+    out.writeln(pre,
+                normalizeField(f.identifier),
+                ' = makeArray(',
+                str(tuple(f.typeInfo.subscripts)),
+                ', lambda: ',
+                valueDecoder(f),
+                ')')
         
 
 def writeFieldDecoder(out, f):
@@ -152,16 +555,14 @@ def writeFieldDecoder(out, f):
     """
     t = f.typeInfo.declType
     rt = util.resolveDecl(t)
-    if rt.kind == sugar.KindStruct:
+    if f.typeInfo.isArray():
+        writeArrayDecoder(out, f, 'self.')
+    elif rt.kind == sugar.KindStruct:
         out.writeln('self.', normalizeField(f.identifier),'.loadFromStream(s)')
     elif f.typeInfo.isString():
         out.writeln('self.', normalizeField(f.identifier), ' = s.getCString()')
     else:
-        out.writeln('self.',
-                    normalizeField(f.identifier),
-                    ' = s.get',
-                    normalize(rt.identifier),
-                    '()')
+        out.writeln('self.', normalizeField(f.identifier), ' = ', valueDecoder(f))
 
 
 def writeDecoder(out, t):
@@ -187,6 +588,12 @@ def writeInitBody(out, t):
             rval = normalizeType(rt.identifier) + '()'
         elif f.typeInfo.isString():
             rval = "''"
+        if f.typeInfo.isArray():
+            rval = ''.join(['makeArray(',
+                            str(tuple(f.typeInfo.subscripts)),
+                            ', lambda: ',
+                            rval,
+                            ')'])
         out.writeln('self.', normalizeField(f.identifier), ' = ', rval)
 
 
@@ -203,6 +610,8 @@ def writeStruct(t):
     # write out a new structure definition
     identifier = normalizeType(t.identifier)
     out = structs
+    if lazy:
+        out = util.OutputBuffer()
     out.writeln('class ', identifier, ':')
     out.incIndent()
     out.writeln('def __init__(self, s=None):')
@@ -217,8 +626,68 @@ def writeStruct(t):
     writeEncoder(out, t)
     out.decIndent()
     out.write('\n\n')
+    out.boundary()
+    if lazy:
+        writeChunk(structs, '_chunks', '_deps', identifier, str(out),
+                   structDeps([f.typeInfo for f in t.fields]))
+    if layouts and isFixedLayout(t):
+        writeLayout(t)
     # return the identifier    
 
+#
+# enum tables
+#
+
+def enumNameForType(t):
+    if parser.isAnonymous(t):
+        # normalized type names never start with an underscore
+        return '_Anonymous'
+    return normalizeType(t.identifier)
+
+
+def coderSuffix(rt):
+    """
+    the suffix of the stream methods coding a scalar of the type rt (enums are
+    coded as int32, like in the cwriter generated code)
+    """
+    if rt.kind == sugar.KindEnum:
+        return 'Int32'
+    return normalize(rt.identifier)
+
+
+def writeEnum(t):
+    """
+    write the enum constants, the <Enum>Names (value -> name) and <Enum>Values
+    (name -> value) tables, and the <Enum> EnumValue subclass that values of
+    the enum are decoded to
+    """
+    if declsSeen.has_key(t):
+        return
+    declsSeen[t] = None
+
+    name = enumNameForType(t)
+    out = structs
+    for c in t.fields:
+        out.writeln(c.identifier, ' = ', str(c.value))
+    out.writeln(name, 'Names = {',
+                ', '.join(['%d: %r' % (v, str(t.byValue[v]))
+                              for v in sorted(t.byValue)]),
+                '}')
+    out.writeln(name, 'Values = {',
+                ', '.join(['%r: %d' % (str(c.identifier), c.value)
+                              for c in t.fields]),
+                '}')
+    out.writeln()
+    out.writeln()
+    out.writeln('class ', name, '(EnumValue):')
+    out.incIndent()
+    out.writeln('__slots__ = ()')
+    out.writeln('names = ', name, 'Names')
+    out.decIndent()
+    out.write('\n\n')
+    out.boundary()
+
+
 #
 # function encoder
 #
@@ -234,31 +703,87 @@ def writeFunction(t):
     # mark the function as visited
     declsSeen[t] = None
     method = util.downCamelize(t.identifier)
-    funcs.indent()
-    funcs.write('def ', method, '(self')
+    out = funcs
+    if lazy:
+        out = util.OutputBuffer()
+    out.indent()
+    out.write('def ', method, '(self')
     for f in t.fields:
-        funcs.write(', _', f.identifier)
-    funcs.write('):')
-    funcs.writeln()
-    funcs.incIndent()
+        out.write(', _', normalizeField(f.identifier))
+    out.write('):')
+    out.writeln()
+    out.incIndent()
     
     # parse input parameters
-    funcs.writeln('s = self._createOstream()')
+    if metrics:
+        # names with an inner underscore can't clash with the normalized
+        # argument names
+        out.writeln('_t_enc = _clock()')
+    if pooled:
+        # borrow from the size class fitting the smallest possible request
+        out.writeln('_s_out = self._borrowOstream(',
+                    str(sum([minWireSize(f.typeInfo) for f in t.fields])), ')')
+        out.writeln('try:')
+        out.incIndent()
+        out.writeln('s = _s_out')
+    else:
+        out.writeln('s = self._createOstream()')
     for f in t.fields:
-        writeFieldEncoder(funcs, f, '_')
+        writeFieldEncoder(out, f, '_')
+    if metrics:
+        out.writeln('_n_out = s.size()')
+        out.writeln('_t_inv = _clock()')
         
     # process (TODO might be nice to support non-blocking)
-    funcs.writeln('s = self._invoke(', util.toMsgId(t.identifier), ', s)\n')
+    out.writeln('s = self._invoke(', util.toMsgId(t.identifier), ', s)')
+    if pooled:
+        # the request stream goes back to the pool once the call is done
+        out.decIndent()
+        out.writeln('finally:')
+        out.incIndent()
+        out.writeln('self._returnOstream(_s_out)')
+        out.decIndent()
+    if metrics:
+        out.writeln('_t_dec = _clock()')
     
-    # handle return by reference
-    for f in t.fields:
-        pass
-        
+    # decode the results in the order the callee encodes them: the return
+    # value followed by the output-by-reference arguments
+    results = []
     if not t.returnInfo.isVoid():
         # decod return value
-        pass
+        results.append(sugar.VarDecl('retv', t.returnInfo))
     
-    funcs.decIndent()
+    # handle return by reference
+    for f in t.fields:
+        if f.typeInfo.isOutputByRef():
+            results.append(f)
+    
+    for f in results:
+        out.writeln('_', normalizeField(f.identifier), ' = ', resultDecoder(f))
+    if metrics:
+        out.writeln('if self._metrics is not None:')
+        out.incIndent()
+        out.writeln('self._metrics.record(',
+                    util.toMsgId(t.identifier),
+                    ', _t_inv - _t_enc, _t_dec - _t_inv, _clock() - _t_dec,',
+                    ' _n_out, s.size())')
+        out.decIndent()
+    if len(results):
+        out.writeln('return ',
+                    ', '.join(['_' + normalizeField(f.identifier)
+                                  for f in results]))
+    out.write('\n')
+    
+    out.decIndent()
+    out.boundary()
+    if lazy:
+        infos = [f.typeInfo for f in t.fields] + [t.returnInfo]
+        deps = structDeps(infos)
+        for f in results:
+            rt = util.resolveDecl(f.typeInfo.declType)
+            if layouts and (rt.kind == sugar.KindStruct) and isFixedLayout(rt):
+                deps.append(layoutNameForType(rt))
+        writeChunk(funcs, '_methods', '_methodDeps', method, str(out), deps)
     return method 
     
         
@@ -267,21 +792,54 @@ def writeNothing(t): pass
 
 transcoders = {
     parser.KindStruct   : writeStruct,
-    parser.KindEnum     : writeNothing,
+    parser.KindEnum     : writeEnum,
     parser.KindFunction : writeFunction,
     parser.KindBuiltIn  : writeNothing,
+    parser.KindAlias    : writeNothing,
 }
 
 
-def process(decls):
-    for t in decls:
+def processDecl(t):
+    if stats.enabled:
+        start = stats.clock()
         transcoders[t.kind](t)
+        stats.declTime('pywriter', t.identifier, stats.clock() - start)
+    else:
+        transcoders[t.kind](t)
+
+
+def process(decls):
+    with stats.timed('pywriter.process'):
+        decls = graph.select(decls)
+        for t in decls:
+            processDecl(t)
     
 
-if __name__ == '__main__':
+def main(argv):
+    """
+    usage: pywriter.py <json-file> [output-prefix [max-bytes]]
+    """
     # parse the given input file
-    with open(sys.argv[1]) as inf: parser.parse(inf)
-    process(parser.getResults())
-    print structs
-    print funcs   
-    
\ No newline at end of file
+    with open(argv[1]) as inf: parser.parse(inf)
+    if len(argv) > 2:
+        # stream into <prefix>.structs.py and <prefix>.funcs.py, or when
+        # size-capped into <prefix>.structs.N.py and <prefix>.funcs.N.py
+        maxBytes = 0
+        if len(argv) > 3:
+            maxBytes = int(argv[3])
+        seq = ''
+        if maxBytes:
+            seq = '.%d'
+        reset(util.FileSink(argv[2] + '.structs' + seq + '.py', maxBytes),
+              util.FileSink(argv[2] + '.funcs' + seq + '.py', maxBytes))
+        process(parser.getResults())
+        structs.close()
+        funcs.close()
+    else:
+        process(parser.getResults())
+        print structs
+        print funcs
+
+
+if __name__ == '__main__':
+    stats.run(main, sys.argv)
@@ -0,0 +1,399 @@
+"""
+Cross-language round-trip conformance and throughput harness.
+
+The header's decls are run through cwriter, and the generated C (together with
+native_stream.c, no-op stubs for the API functions and a small dispatch loop)
+is built with the local C compiler into a stand-in server process. The
+pywriter generated bindings then drive the server over a pipe with randomized
+argument values. Since the stubs do nothing, every output-by-reference argument
+must come back unchanged, and every return value must be zero. Any mismatch
+fails the run.
+
+Frames are <fun-id u32><length u32><payload> in both directions (the response
+omits the fun-id), where fun-ids are the functions' positions in the decl list.
+
+usage:
+    python roundtrip.py [options] [header json-file]
+"""
+
+import os
+import sys
+import time
+import ctypes
+import random
+import shutil
+import struct
+import argparse
+import tempfile
+import subprocess
+sys.path.append('../') # permit access to parent directory modules
+from pycjson import util, parser, sugar
+import cwriter
+import pywriter
+import pystream
+import pymetrics
+
+poke = os.path.dirname(os.path.abspath(__file__))
+streamDir = os.path.join(poke, 'CNativeStream')
+cc = os.environ.get('CC', 'cc')
+
+frameHeader = struct.Struct('=II')
+frameLength = struct.Struct('=I')
+
+serverMain = """
+typedef void (*handler_t)(stream_t* ins, stream_t* outs);
+static const handler_t handlers[] = {%(handlers)s};
+
+STREAM_DECLARE(ins, 65535);
+STREAM_DECLARE(outs, 65535);
+
+int main(void)
+{
+    uint32_t hdr[2];
+    while (fread(hdr, sizeof(hdr), 1, stdin) == 1)
+    {
+        stream_reset(ins);
+        stream_reset(outs);
+        if ((hdr[0] >= %(count)d) || (hdr[1] > ins->capacity))
+            return 2;
+        if (hdr[1] && (fread(ins->buf, hdr[1], 1, stdin) != 1))
+            return 2;
+        ins->used = hdr[1];
+        handlers[hdr[0]](ins, outs);
+        uint32_t len = (uint32_t)outs->used;
+        fwrite(&len, sizeof(len), 1, stdout);
+        fwrite(outs->buf, len, 1, stdout);
+        fflush(stdout);
+    }
+    return 0;
+}
+"""
+
+# (min, max) of the randomized integer values
+intRanges = {
+    'char':     (-128, 127),
+    'int8_t':   (-128, 127),
+    'uint8_t':  (0, 255),
+    'int16_t':  (-2 ** 15, 2 ** 15 - 1),
+    'uint16_t': (0, 2 ** 16 - 1),
+    'int32_t':  (-2 ** 31, 2 ** 31 - 1),
+    'uint32_t': (0, 2 ** 32 - 1),
+    'int64_t':  (-2 ** 63, 2 ** 63 - 1),
+    'uint64_t': (0, 2 ** 64 - 1),
+}
+
+stringChars = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 _'
+
+
+class MismatchError(Exception):
+    pass
+
+
+#
+# C stand-in server
+#
+
+def cTypeForVar(info):
+    """
+    render the C type of a parsed VarInfo (i.e. 'const greeting_t*')
+    """
+    s = ''
+    quals = info.quals[:]
+    while len(quals) and quals[0] == sugar.QualConst:
+        s += 'const '
+        quals.pop(0)
+    s += info.declType.identifier
+    for q in quals:
+        if q == sugar.QualPtr:
+            s += '*'
+        else:
+            s += ' const'
+    return s
+
+
+def writeStub(out, t):
+    """
+    write a no-op definition of the API function t
+    """
+    args = ', '.join([cTypeForVar(f.typeInfo) + ' ' + f.identifier
+                      + ''.join(['[%d]' % n for n in f.typeInfo.subscripts])
+                          for f in t.fields]) or 'void'
+    out.writeln(cTypeForVar(t.returnInfo), ' ', t.identifier, '(', args, ')')
+    out.writeln('{')
+    out.incIndent()
+    for f in t.fields:
+        out.writeln('(void)', f.identifier, ';')
+    if not t.returnInfo.isVoid():
+        out.writeln(cTypeForVar(t.returnInfo), ' r;')
+        out.writeln('memset(&r, 0, sizeof(r));')
+        out.writeln('return r;')
+    out.decIndent()
+    out.writeln('}\n')
+
+
+def serverSource(header, funcs):
+    """
+    returns the C source of the stand-in server
+    """
+    stubs = util.OutputBuffer()
+    for t in funcs:
+        writeStub(stubs, t)
+    return ''.join([
+        '#include <stdio.h>\n',
+        '#include <string.h>\n',
+        '#include <stddef.h>\n',
+        '#include "', os.path.abspath(header), '"\n',
+        '#include <native_stream.h>\n\n',
+        str(cwriter.structs),
+        str(cwriter.funcs),
+        str(stubs),
+        serverMain % {'handlers': ', '.join(['_' + t.identifier for t in funcs]),
+                      'count': len(funcs)}])
+
+
+def buildServer(header, funcs, workDir):
+    """
+    compile the stand-in server, returns the path of the executable
+    """
+    src = os.path.join(workDir, 'server.c')
+    exe = os.path.join(workDir, 'server')
+    with open(src, 'w') as outf:
+        outf.write(serverSource(header, funcs))
+    subprocess.check_call([cc, '-O2', '-std=gnu99', '-w',
+                           '-I', streamDir,
+                           src, os.path.join(streamDir, 'native_stream.c'),
+                           '-o', exe])
+    return exe
+
+
+#
+# python client
+#
+
+def loadBindings(funcs):
+    """
+    exec the pywriter generated bindings, returns the module namespace
+    """
+    ns = {}
+    for (i, t) in enumerate(funcs):
+        ns[util.toMsgId(t.identifier)] = i
+    exec str(pywriter.structs) + '\n' + str(pywriter.funcs) in ns
+    return ns
+
+
+def clientClass(ns, lazyStrings=False):
+    """
+    create an ApiBase subclass that talks to the server over its pipes
+    """
+    class Client(ns['ApiBase']):
+        def __init__(self, proc):
+            self.proc = proc
+            self.bytes = 0
+
+        def _createOstream(self):
+            return pystream.BinaryStream(lengthPrefixed=self.lengthPrefixed)
+
+        def _invoke(self, method, s):
+            payload = s.getvalue()
+            self.proc.stdin.write(frameHeader.pack(method, len(payload)))
+            self.proc.stdin.write(payload)
+            self.proc.stdin.flush()
+            hdr = self.proc.stdout.read(frameLength.size)
+            if len(hdr) != frameLength.size:
+                raise MismatchError('server exited (%s)' % self.proc.poll())
+            (n,) = frameLength.unpack(hdr)
+            data = self.proc.stdout.read(n)
+            self.bytes += len(payload) + len(data)
+            return pystream.BinaryStream(data, self.lengthPrefixed,
+                                         lazyStrings)
+
+    Client.lengthPrefixed = (cwriter.stringWire == cwriter.StringWireLength)
+    return Client
+
+
+def randomValue(rnd, ns, info):
+    """
+    returns a random value of the type described by info (a VarInfo)
+    """
+    def scalar():
+        rt = util.resolveDecl(info.declType)
+        if info.isString():
+            return ''.join([rnd.choice(stringChars)
+                                for i in range(rnd.randint(0, 16))])
+        if rt.kind == sugar.KindStruct:
+            obj = ns[pywriter.normalizeType(rt.identifier)]()
+            for f in rt.fields:
+                setattr(obj, pywriter.normalizeField(f.identifier),
+                        randomValue(rnd, ns, f.typeInfo))
+            return obj
+        if rt.kind == sugar.KindEnum:
+            return rnd.choice(sorted(rt.byValue))
+        if rt.identifier == 'float':
+            # restrict to values representable as float
+            return struct.unpack('=f', struct.pack('=f', rnd.uniform(-1e6, 1e6)))[0]
+        if rt.identifier == 'double':
+            return rnd.uniform(-1e12, 1e12)
+        if not intRanges.has_key(rt.identifier):
+            raise MismatchError('unsupported type ' + rt.identifier)
+        return rnd.randint(*intRanges[rt.identifier])
+
+    def array(subs):
+        if not len(subs):
+            return scalar()
+        return [array(subs[1:]) for i in range(subs[0])]
+
+    return array(info.subscripts)
+
+
+def plain(v):
+    """
+    convert generated struct instances into comparable dicts
+    """
+    if isinstance(v, list):
+        return [plain(i) for i in v]
+    if isinstance(v, tuple):
+        return tuple([plain(i) for i in v])
+    if isinstance(v, ctypes.Array):
+        return [plain(i) for i in v]
+    if isinstance(v, ctypes.Structure):
+        return dict([(k, plain(getattr(v, k))) for (k, _) in v._fields_])
+    if hasattr(v, '__dict__'):
+        return dict([(k, plain(i)) for (k, i) in v.__dict__.items()])
+    return v
+
+
+def expectedResult(t, args):
+    """
+    the result the no-op server must produce for the call t(*args)
+    """
+    results = []
+    if not t.returnInfo.isVoid():
+        results.append(0)
+    for (f, a) in zip(t.fields, args):
+        if f.typeInfo.isOutputByRef():
+            results.append(a)
+    if len(results) == 0:
+        return None
+    if len(results) == 1:
+        return results[0]
+    return tuple(results)
+
+
+def percentile(sortedValues, p):
+    return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * p))]
+
+
+def run(header, jsonPath, calls=1000, seed=0, metrics=False, pooled=False,
+        layouts=False, lazyStrings=False):
+    """
+    build the server, run the randomized calls and return the statistics
+    (including the per-method pymetrics report when metrics is set). The
+    bindings borrow their request streams from pools when pooled is set,
+    decode fixed-layout results in place when layouts is set, and decode
+    strings as pystream.LazyString when lazyStrings is set. Raises
+    MismatchError if a result does not round-trip
+    """
+    parser.reset()
+    with open(jsonPath) as inf: parser.parse(inf)
+    decls = parser.getResults()
+    funcs = [t for t in decls if t.kind == sugar.KindFunction]
+    if not len(funcs):
+        raise MismatchError('no functions to call')
+    cwriter.reset()
+    cwriter.process(decls)
+    pywriter.metrics = metrics
+    pywriter.pooled = pooled
+    pywriter.layouts = layouts
+    pywriter.reset()
+    pywriter.process(decls)
+
+    rnd = random.Random(seed)
+    workDir = tempfile.mkdtemp()
+    try:
+        exe = buildServer(header, funcs, workDir)
+        ns = loadBindings(funcs)
+        proc = subprocess.Popen([exe], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE)
+        client = clientClass(ns, lazyStrings)(proc)
+        if metrics:
+            client._metrics = pymetrics.HistogramSink(range(len(funcs)))
+        latencies = []
+        start = time.time()
+        for n in range(calls):
+            t = rnd.choice(funcs)
+            args = [randomValue(rnd, ns, f.typeInfo) for f in t.fields]
+            expected = plain(expectedResult(t, args))
+            method = getattr(client, util.downCamelize(t.identifier))
+            t0 = time.time()
+            actual = plain(method(*args))
+            latencies.append(time.time() - t0)
+            if actual != expected:
+                raise MismatchError('%s: expected %r got %r'
+                                        % (t.identifier, expected, actual))
+        elapsed = time.time() - start
+        proc.stdin.close()
+        proc.wait()
+    finally:
+        shutil.rmtree(workDir)
+
+    latencies.sort()
+    result = {'calls': calls,
+              'msgs/s': calls / elapsed,
+              'bytes/s': client.bytes / elapsed,
+              'p50 us': percentile(latencies, 0.50) * 1e6,
+              'p90 us': percentile(latencies, 0.90) * 1e6,
+              'p99 us': percentile(latencies, 0.99) * 1e6}
+    if metrics:
+        result['metrics'] = client._metrics.report(
+            dict([(i, t.identifier) for (i, t) in enumerate(funcs)]))
+    return result
+
+
+def main(argv):
+    """
+    command line entry point
+    """
+    ap = argparse.ArgumentParser(description='round-trip conformance test')
+    ap.add_argument('header', nargs='?')
+    ap.add_argument('json', nargs='?', help='c2json output for the header')
+    ap.add_argument('-n', '--calls', type=int, default=1000)
+    ap.add_argument('--codec', default=cwriter.CodecUnrolled,
+                    choices=(cwriter.CodecUnrolled, cwriter.CodecTable),
+                    help='cwriter codec mode')
+    ap.add_argument('--strings', default=cwriter.StringWireNul,
+                    choices=(cwriter.StringWireNul, cwriter.StringWireLength),
+                    help='string wire format')
+    ap.add_argument('--metrics', action='store_true',
+                    help='record and print the per-method metrics')
+    ap.add_argument('--pooled', action='store_true',
+                    help='borrow request streams from per-thread pools')
+    ap.add_argument('--layouts', action='store_true',
+                    help='decode fixed-layout results through ctypes layouts')
+    ap.add_argument('--lazy-strings', action='store_true',
+                    help='decode strings as pystream.LazyString')
+    args = ap.parse_args(argv[1:])
+    if args.header is None:
+        args.header = os.path.join(poke, '..', 'test-inputs', 'test.h')
+        args.json = os.path.join(poke, '..', 'test-outputs', 'test.json')
+    elif args.json is None:
+        ap.error('the json file of the header is required')
+
+    cwriter.codecMode = args.codec
+    cwriter.stringWire = args.strings
+    try:
+        stats = run(args.header, args.json, args.calls, metrics=args.metrics,
+                    pooled=args.pooled, layouts=args.layouts,
+                    lazyStrings=args.lazy_strings)
+    except MismatchError, e:
+        print 'FAIL:', e
+        sys.exit(1)
+    for k in ('calls', 'msgs/s', 'bytes/s', 'p50 us', 'p90 us', 'p99 us'):
+        print '%-8s %12.1f' % (k, stats[k])
+    for (name, m) in sorted(stats.get('metrics', {}).items()):
+        print '%-24s calls %6d  out %8d B  in %8d B  invoke %8.1f us/call' \
+            % (name, m['calls'], m['bytesOut'], m['bytesIn'],
+               m['invokeTime'] / max(m['calls'], 1) * 1e6)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,197 @@
+"""
+Runs one of the poke writers (pywriter, cwriter) over the parsed decls in
+parallel. The decls are partitioned into the connected components of the
+type-dependency graph, the components are grouped into shards, and each shard
+is processed by a worker in a process pool.
+
+Every top-level decl is generated into its own chunk, which is tagged with the
+decl's position in the input. Since the components share no generated types,
+sorting the chunks by position reproduces the serial output byte-for-byte.
+
+usage:
+    python shard.py <writer> <json-file> [jobs] [output-file]
+
+When an output file is given, each shard is written to its own source file
+(i.e. out.c -> out.0.c, out.1.c, ...) instead of merging to stdout. pywriter
+output is split differently, since its methods all belong to one ApiBase: the
+structs of each shard go into their own module (out.py -> out_0.py, out_1.py,
+...), and out.py holds the ApiBase with every method and imports the struct
+modules, so importing it gives the same API as the serial output.
+"""
+
+import os
+import sys
+import multiprocessing
+sys.path.append('../') # permit access to parent directory modules
+from pycjson import util, parser, graph, stats
+
+
+def processShard(writer, shard):
+    """
+    run the writer over the (index, decl) pairs of a shard. Returns the
+    writer's prologues along with the per-decl (index, structs, funcs) chunks
+    """
+    writer.reset()
+    prologue = (str(writer.structs), str(writer.funcs))
+    chunks = []
+    for (index, t) in shard:
+        writer.structs = util.OutputBuffer(writer.structs.indentLevel)
+        writer.funcs = util.OutputBuffer(writer.funcs.indentLevel)
+        writer.processDecl(t)
+        chunks.append((index, str(writer.structs), str(writer.funcs)))
+    return prologue, chunks
+
+
+def _runShard(job):
+    """
+    pool entry point
+    """
+    (writerName, shard) = job
+    return processShard(__import__(writerName), shard)
+
+
+def _collectShard(job):
+    """
+    pool entry point, also returns the statistics recorded by the worker
+    """
+    return stats.collect(_runShard, job)
+
+
+def generateShards(writerName, decls, jobs=None):
+    """
+    process the decls using a pool of worker processes. Returns a list holding
+    the output of processShard for every shard
+    """
+    jobs = jobs or multiprocessing.cpu_count()
+    writer = __import__(writerName)
+    with stats.timed('shard.partition'):
+        # prune up front, so the workers only see what gets generated
+        decls = graph.select(decls)
+        work = [(writerName, s) for s in graph.shards(decls, jobs)]
+    if len(work) <= 1:
+        return [_runShard(w) for w in work]
+    pool = multiprocessing.Pool(min(jobs, len(work)))
+    try:
+        return stats.mergeResults(pool.map(_collectShard, work))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def merge(results):
+    """
+    merge the shard results into (structs, funcs) strings identical to the
+    contents of the writer buffers after a serial run
+    """
+    if not len(results):
+        # nothing to merge, fall back to the writer's prologue
+        return ('', '')
+    structsPrologue, funcsPrologue = results[0][0]
+    chunks = sorted([c for (_, cs) in results for c in cs], key=lambda c: c[0])
+    return (structsPrologue + ''.join([c[1] for c in chunks]),
+            funcsPrologue + ''.join([c[2] for c in chunks]))
+
+
+def generate(writerName, decls, jobs=None):
+    """
+    parallel equivalent of writer.process(decls) that returns the generated
+    (structs, funcs) strings
+    """
+    results = generateShards(writerName, decls, jobs)
+    if not len(results):
+        writer = __import__(writerName)
+        writer.reset()
+        return (str(writer.structs), str(writer.funcs))
+    return merge(results)
+
+
+# head of the pywriter ApiBase module, pulls in the names (including the
+# underscored ones) of the struct modules
+moduleImports = """
+import %(modules)s
+for _module in [%(modules)s]:
+    for _name in dir(_module):
+        if not _name.startswith('__'):
+            globals()[_name] = getattr(_module, _name)
+del _module, _name
+"""
+
+
+def writeModules(decls, path, jobs=None):
+    """
+    pywriter flavour of writeFiles, writes the structs of each shard into
+    <base>_N.py and the ApiBase into path. Returns the list of paths written
+    (path last)
+    """
+    writer = __import__('pywriter')
+    if writer.lazy:
+        raise ValueError('lazy bindings can not be split into modules')
+    base, ext = os.path.splitext(path)
+    results = generateShards('pywriter', decls, jobs)
+    paths = []
+    for ((structsPrologue, _), chunks) in results:
+        structs = ''.join([c[1] for c in chunks])
+        if not structs:
+            # shard holds nothing but functions and builtins
+            continue
+        paths.append('%s_%d%s' % (base, len(paths), ext))
+        with open(paths[-1], 'w') as outf:
+            outf.write(structsPrologue + structs + '\n')
+    if len(results):
+        funcs = merge(results)[1]
+    else:
+        writer.reset()
+        funcs = str(writer.funcs)
+    modules = ', '.join([os.path.splitext(os.path.basename(p))[0] for p in paths])
+    with open(path, 'w') as outf:
+        if modules:
+            outf.write(moduleImports % {'modules': modules} + '\n')
+        outf.write(funcs + '\n')
+    paths.append(path)
+    return paths
+
+
+def writeFiles(writerName, decls, path, jobs=None):
+    """
+    process the decls and write each shard to its own source file (see
+    writeModules for pywriter). Returns the list of paths written
+    """
+    outDir = os.path.dirname(path)
+    if outDir and not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    if writerName == 'pywriter':
+        return writeModules(decls, path, jobs)
+    base, ext = os.path.splitext(path)
+    paths = []
+    for result in generateShards(writerName, decls, jobs):
+        if not [c for c in result[1] if c[1] or c[2]]:
+            # shard holds nothing that generates code (i.e. builtins)
+            continue
+        structs, funcs = merge([result])
+        paths.append('%s.%d%s' % (base, len(paths), ext))
+        with open(paths[-1], 'w') as outf:
+            outf.write(structs + '\n' + funcs + '\n')
+    return paths
+
+
+def main(argv):
+    """
+    command line entry point
+    """
+    # parse the given input file
+    with open(argv[2]) as inf: parser.parse(inf)
+    jobs = None
+    if len(argv) > 3:
+        jobs = int(argv[3])
+    if len(argv) > 4:
+        for p in writeFiles(argv[1], parser.getResults(), argv[4], jobs):
+            print p
+    else:
+        with stats.timed('shard.generate'):
+            structs, funcs = generate(argv[1], parser.getResults(), jobs)
+        print structs
+        print funcs
+
+
+if __name__ == '__main__':
+    stats.run(main, sys.argv)
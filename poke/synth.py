@@ -0,0 +1,113 @@
+"""
+Generates synthetic APIs for benchmarking the code generators. An API is made
+up of a C header declaring structs (scalars, strings, arrays and nested
+structs) with one function per struct, along with the JSON records that c2json
+would emit for the header.
+"""
+
+import random
+
+# (C type, wire size) of the scalar field types
+scalarTypes = (
+    ('uint8_t',  1),
+    ('int16_t',  2),
+    ('uint16_t', 2),
+    ('int32_t',  4),
+    ('uint32_t', 4),
+    ('int64_t',  8),
+    ('double',   8))
+
+# upper bound on the encoded size of a synthetic struct
+MaxWireSize = 2048
+
+
+def structName(i):
+    return 's%d_t' % i
+
+
+def funcName(i):
+    return 'fn_%d' % i
+
+
+def synthesize(count, seed=0, strings=True):
+    """
+    returns (records, header) describing count synthetic structs and functions
+    """
+    rnd = random.Random(seed)
+    records = []
+    header = ['#pragma once', '#include <stdint.h>', '']
+    sizes = []
+    for i in range(count):
+        fields = []
+        size = 0
+        for j in range(rnd.randint(2, 8)):
+            ident = 'f%d' % j
+            pick = rnd.random()
+            if strings and pick < 0.15:
+                fields.append((ident, 'char *', 'char* %s' % ident))
+                size += 8
+                continue
+            if i and pick < 0.35:
+                n = rnd.randrange(i)
+                dims = rnd.choice(([], [2], [3, 2]))
+                width = sizes[n]
+                for d in dims: width *= d
+                if size + width < MaxWireSize:
+                    subs = ''.join(['[%d]' % d for d in dims])
+                    kind = structName(n) + (' ' + subs if subs else '')
+                    fields.append((ident, kind,
+                                   '%s %s%s' % (structName(n), ident, subs)))
+                    size += width
+                    continue
+            (ctype, width) = rnd.choice(scalarTypes)
+            dims = rnd.choice(([], [], [4]))
+            subs = ''.join(['[%d]' % d for d in dims])
+            kind = ctype + (' ' + subs if subs else '')
+            fields.append((ident, kind, '%s %s%s' % (ctype, ident, subs)))
+            for d in dims: width *= d
+            size += width
+        sizes.append(size)
+        records.append({
+            'identifier': structName(i),
+            'kind': 'struct',
+            'fields': [{'identifier': f, 'kind': k} for (f, k, _) in fields]})
+        header.append('typedef struct')
+        header.append('{')
+        header += ['    %s;' % c for (_, _, c) in fields]
+        header.append('} %s;' % structName(i))
+        header.append('')
+    for i in range(count):
+        records.append({
+            'identifier': funcName(i),
+            'kind': 'function',
+            'fields': [{'identifier': 'v', 'kind': structName(i) + ' *'}],
+            'return': 'void'})
+        header.append('void %s(%s* v);' % (funcName(i), structName(i)))
+    return records, '\n'.join(header) + '\n'
+
+
+def fillFunctions(records):
+    """
+    returns C source defining fill_<struct>(v), which points every string
+    field of a zeroed struct at a constant so the struct can be encoded
+    """
+    out = []
+    for rec in records:
+        if rec['kind'] != 'struct':
+            continue
+        name = rec['identifier']
+        out.append('static void fill_%s(%s* v)' % (name[:-2], name))
+        out.append('{')
+        for f in rec['fields']:
+            parts = f['kind'].split(' ')
+            count = 1
+            for sub in parts[-1].split(']')[:-1]:
+                count *= int(sub[1:])
+            if parts[0] == 'char':
+                out.append('    v->%s = "synthetic";' % f['identifier'])
+            elif parts[0].startswith('s') and parts[0].endswith('_t'):
+                out.append('    for (int i = 0; i < %d; i++) fill_%s(&((%s*)&v->%s)[i]);'
+                           % (count, parts[0][:-2], parts[0], f['identifier']))
+        out.append('}')
+        out.append('')
+    return '\n'.join(out)
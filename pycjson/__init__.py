@@ -1,3 +1,6 @@
 import parser
 import sugar
-import util
\ No newline at end of file
+import util
+import graph
+import ir
+import stats
\ No newline at end of file
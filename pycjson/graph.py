@@ -0,0 +1,129 @@
+"""
+type-dependency graph helpers. Used by the code generators to split the parsed
+decls into independent units of work that can be processed concurrently, and
+to prune the decls down to what a selection of functions needs
+"""
+
+from fnmatch import fnmatchcase
+from sugar import *
+
+
+# the function selection applied by select (and so by the writers): only the
+# functions whose identifier matches a pattern of allow (fnmatch style, None
+# selects every function) and none of deny are generated, along with the types
+# they reach. Unreachable structs, enums and aliases are dropped
+allow = None
+deny = None
+
+
+def dependenciesOf(t):
+    """
+    returns the decls directly referenced by t (builtin types are ignored since
+    they are shared by everything and carry no generated code)
+    """
+    deps = []
+    if t.kind in (KindStruct, KindFunction):
+        deps = [f.typeInfo.declType for f in t.fields]
+    if t.kind == KindFunction:
+        deps.append(t.returnInfo.declType)
+    if t.kind == KindAlias:
+        deps = [t.typeInfo.declType]
+    return [d for d in deps if d.kind != KindBuiltIn]
+
+
+def matches(identifier, patterns):
+    """
+    true if identifier matches any of the (fnmatch style) patterns
+    """
+    for p in patterns:
+        if fnmatchcase(identifier, p):
+            return True
+    return False
+
+
+def prune(decls, allow=None, deny=None):
+    """
+    returns the decls reachable from the selected functions, in input order.
+    Functions are selected when their identifier matches a pattern of allow
+    (every function when allow is None) and none of deny. Types are kept when
+    a selected function depends on them, so deny only applies to functions.
+    The decls are returned unchanged when neither list is given
+    """
+    if allow is None and not deny:
+        return decls
+    decls = list(decls)
+    deny = deny or ()
+    pending = [t for t in decls if t.kind == KindFunction
+               and (allow is None or matches(t.identifier, allow))
+               and not matches(t.identifier, deny)]
+    seen = set([t.identifier for t in pending])
+    while len(pending):
+        for d in dependenciesOf(pending.pop()):
+            if d.identifier not in seen:
+                seen.add(d.identifier)
+                pending.append(d)
+    return [t for t in decls if t.identifier in seen]
+
+
+def select(decls):
+    """
+    prune the decls with the module's allow/deny selection
+    """
+    return prune(decls, allow, deny)
+
+
+def components(decls):
+    """
+    partition decls into the connected components of the type-dependency
+    graph. Each component is a list of (index, decl) pairs in input order, and
+    the components are ordered by the index of their first decl
+    """
+    # decls are keyed by identifier rather than object, since a registry may
+    # build a decl anew on every lookup (i.e. an ir.Snapshot)
+    decls = list(decls)
+    parent = {}
+
+    def find(k):
+        root = k
+        while parent[root] != root:
+            root = parent[root]
+        while parent[k] != root:
+            parent[k], k = root, parent[k]
+        return root
+
+    def union(a, b):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    # key decls by the index of their first appearance
+    index = {}
+    for i, t in enumerate(decls):
+        index.setdefault(t.identifier, i)
+        parent.setdefault(index[t.identifier], index[t.identifier])
+
+    for i, t in enumerate(decls):
+        for d in dependenciesOf(t):
+            if not index.has_key(d.identifier):
+                # referenced but not part of the input (i.e. a forward decl)
+                continue
+            union(index[t.identifier], index[d.identifier])
+
+    groups = {}
+    for i, t in enumerate(decls):
+        groups.setdefault(find(index[t.identifier]), []).append((i, t))
+    return [groups[k] for k in sorted(groups)]
+
+
+def shards(decls, count):
+    """
+    group the components of decls into at most count shards of roughly equal
+    size. The assignment is deterministic, and each shard is a list of
+    (index, decl) pairs in input order
+    """
+    count = max(1, count)
+    bins = [[] for i in range(count)]
+    for c in sorted(components(decls), key=lambda c: (-len(c), c[0][0])):
+        smallest = min(range(count), key=lambda i: (len(bins[i]), i))
+        bins[smallest] += c
+    return [sorted(b, key=lambda p: p[0]) for b in bins if len(b)]
@@ -0,0 +1,510 @@
+"""
+compact binary intermediate format for the c2json output. The format is loaded
+by mmap'ing the file, and decls are only built when they are accessed, so
+loading a large SDK costs next to nothing.
+
+layout (little endian):
+
+    header      magic 'CJIR', version u16, flags u16, record count u32,
+                string count u32, field table offset u32, string table
+                offset u32
+    records     one fixed-size record per decl: kind u8, 3 pad bytes,
+                identifier u32, field count u32, first field u32, return
+                type u32 (functions only, the aliased type of typedefs)
+    fields      identifier u32, value i64 (the type string of struct/function
+                fields, the value of enum constants)
+    names       (when flags has FlagNameIndex) the record numbers ordered by
+                identifier, one u32 per record, immediately preceding the
+                string table
+    strings     (offset u32, length u32) for every string, followed by the
+                string bytes. Identifiers and type strings are stored once
+
+A parsed registry can also be frozen into an image (freeze), held in an
+anonymous shared mapping or a file. Worker processes forked after freezing, or
+attaching to the file, look decls up through a Snapshot, which builds them
+from the image on demand and only keeps them while they are referenced, so
+the registry is held once by the OS rather than once per worker.
+
+usage:
+    python ir.py <json-file> <ir-file>
+"""
+
+import sys
+import json
+import mmap
+import struct
+import weakref
+import parser
+import sugar
+import stats
+
+Magic   = 'CJIR'
+Version = 1
+
+header = struct.Struct('<4sHHIIII')
+record = struct.Struct('<B3xIIII')
+field  = struct.Struct('<Iq')
+string = struct.Struct('<II')
+
+# record kind codes
+kindCodes = {
+    parser.KindNameStruct   : 1,
+    parser.KindNameEnum     : 2,
+    parser.KindNameFunction : 3,
+    parser.KindNameTypedef  : 4,
+}
+kindNames = dict([(v, k) for (k, v) in kindCodes.items()])
+
+NoString = 0xffffffff
+
+# header flags
+FlagNameIndex = 0x1
+
+nameIndex = struct.Struct('<I')
+
+
+class FormatError(Exception):
+    pass
+
+
+#
+# writer
+#
+
+class StringTable:
+    """
+    interns strings, assigning each a stable index
+    """
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def add(self, s):
+        if not self.index.has_key(s):
+            self.index[s] = len(self.strings)
+            self.strings.append(s)
+        return self.index[s]
+
+
+def mergeAnonymousEnums(records):
+    """
+    fold all anonymous enums into the first one (mirroring parser.parseEnum)
+    so that records and decls correspond one-to-one
+    """
+    result = []
+    anon = None
+    for rec in records:
+        if rec[parser.FieldIdent] == parser.AnonymousEnum:
+            if anon is not None:
+                anon[parser.FieldFields] += rec[parser.FieldFields]
+                continue
+            rec = dict(rec)
+            rec[parser.FieldFields] = list(rec[parser.FieldFields])
+            anon = rec
+        result.append(rec)
+    return result
+
+
+def dropUnknownAliases(records):
+    """
+    drop the typedefs that parser.parseTypedef would ignore (aliases of types
+    that are neither builtin nor declared), so that records and decls
+    correspond one-to-one
+    """
+    known = set([t.identifier for t in parser.builtins])
+    result = []
+    for rec in records:
+        if rec[parser.FieldKind] == parser.KindNameTypedef \
+                and parser.identifierOf(rec[parser.FieldType]) not in known:
+            continue
+        known.add(rec[parser.FieldIdent])
+        result.append(rec)
+    return result
+
+
+def fromRecords(records):
+    """
+    encode c2json records, returns the image as a string
+    """
+    records = dropUnknownAliases(mergeAnonymousEnums(records))
+    strings = StringTable()
+    recs = []
+    fields = []
+    for rec in records:
+        kind = rec[parser.FieldKind]
+        ret = NoString
+        if kind == parser.KindNameFunction:
+            ret = strings.add(rec[parser.FieldReturn])
+        elif kind == parser.KindNameTypedef:
+            ret = strings.add(rec[parser.FieldType])
+        first = len(fields)
+        for f in rec[parser.FieldFields]:
+            if kind == parser.KindNameEnum:
+                value = f[parser.FieldValue]
+            else:
+                value = strings.add(f[parser.FieldKind])
+            fields.append(field.pack(strings.add(f[parser.FieldIdent]), value))
+        recs.append(record.pack(kindCodes[kind],
+                                strings.add(rec[parser.FieldIdent]),
+                                len(fields) - first,
+                                first,
+                                ret))
+
+    # record numbers sorted by (utf-8) identifier, for binary search
+    names = sorted(range(len(records)),
+                   key=lambda i: (records[i][parser.FieldIdent].encode('utf-8'), i))
+    names = [nameIndex.pack(i) for i in names]
+
+    fieldsOffset = header.size + record.size * len(recs)
+    stringsOffset = fieldsOffset + field.size * len(fields) \
+                        + nameIndex.size * len(names)
+    index = []
+    blob = []
+    offset = stringsOffset + string.size * len(strings.strings)
+    for s in strings.strings:
+        s = s.encode('utf-8')
+        index.append(string.pack(offset, len(s)))
+        blob.append(s)
+        offset += len(s)
+
+    return ''.join([header.pack(Magic, Version, FlagNameIndex, len(recs),
+                                len(strings.strings), fieldsOffset,
+                                stringsOffset)]
+                   + recs + fields + names + index + blob)
+
+
+def recordsFromDecls(decls):
+    """
+    the c2json records of parsed decls (builtins are skipped)
+    """
+    records = []
+    for t in decls:
+        if t.kind == sugar.KindBuiltIn:
+            continue
+        rec = {parser.FieldIdent: t.identifier}
+        if t.kind == sugar.KindEnum:
+            rec[parser.FieldKind] = parser.KindNameEnum
+            rec[parser.FieldFields] = [{parser.FieldIdent: c.identifier,
+                                        parser.FieldValue: c.value}
+                                            for c in t.fields]
+        elif t.kind == sugar.KindAlias:
+            rec[parser.FieldKind] = parser.KindNameTypedef
+            rec[parser.FieldFields] = []
+            rec[parser.FieldType] = parser.typeString(t.typeInfo)
+        else:
+            rec[parser.FieldKind] = parser.KindNameStruct
+            if t.kind == sugar.KindFunction:
+                rec[parser.FieldKind] = parser.KindNameFunction
+                rec[parser.FieldReturn] = parser.typeString(t.returnInfo)
+            rec[parser.FieldFields] = [{parser.FieldIdent: f.identifier,
+                                        parser.FieldKind:
+                                            parser.typeString(f.typeInfo)}
+                                            for f in t.fields]
+        records.append(rec)
+    return records
+
+
+def convert(jsonPath, irPath):
+    """
+    convert a c2json output file into the binary format
+    """
+    with open(jsonPath) as inf:
+        image = fromRecords(json.load(inf))
+    with open(irPath, 'wb') as outf:
+        outf.write(image)
+
+
+#
+# loader
+#
+
+class Image:
+    """
+    read-only view of an encoded image (any object supporting the buffer
+    interface, i.e. an mmap)
+    """
+    def __init__(self, buf):
+        self.buf = buf
+        if len(buf) < header.size:
+            raise FormatError('truncated image')
+        (magic, version, self.flags,
+         self.recordCount, self.stringCount,
+         self.fieldsOffset, self.stringsOffset) = header.unpack_from(buf, 0)
+        if magic != Magic or version != Version:
+            raise FormatError('not a CJIR image (or unsupported version)')
+        self.strings = {}
+        self.names = None
+
+    def rawString(self, i):
+        """
+        the utf-8 bytes of the string with index i (not cached)
+        """
+        (offset, length) = string.unpack_from(self.buf,
+                                              self.stringsOffset + string.size * i)
+        return self.buf[offset:offset + length]
+
+    def string(self, i):
+        """
+        the string with index i
+        """
+        s = self.strings.get(i)
+        if s is None:
+            (offset, length) = string.unpack_from(self.buf,
+                                                  self.stringsOffset + string.size * i)
+            s = self.buf[offset:offset + length].decode('utf-8')
+            self.strings[i] = s
+        return s
+
+    def recordHeader(self, i):
+        """
+        the raw (kind, identifier, field count, first field, return) of record i
+        """
+        return record.unpack_from(self.buf, header.size + record.size * i)
+
+    def identifier(self, i):
+        return self.string(self.recordHeader(i)[1])
+
+    def record(self, i):
+        """
+        decode record i into the c2json record representation
+        """
+        (kind, ident, count, first, ret) = self.recordHeader(i)
+        kind = kindNames[kind]
+        fields = []
+        for n in range(first, first + count):
+            (fident, value) = field.unpack_from(self.buf,
+                                                self.fieldsOffset + field.size * n)
+            if kind == parser.KindNameEnum:
+                fields.append({parser.FieldIdent: self.string(fident),
+                               parser.FieldValue: value})
+            else:
+                fields.append({parser.FieldIdent: self.string(fident),
+                               parser.FieldKind: self.string(value)})
+        rec = {parser.FieldIdent: self.string(ident),
+               parser.FieldKind: kind,
+               parser.FieldFields: fields}
+        if kind == parser.KindNameFunction:
+            rec[parser.FieldReturn] = self.string(ret)
+        elif kind == parser.KindNameTypedef:
+            rec[parser.FieldType] = self.string(ret)
+        return rec
+
+    def find(self, identifier):
+        """
+        the index of the record that declares identifier (or None)
+        """
+        if self.flags & FlagNameIndex:
+            # binary search the name index, nothing is cached
+            key = identifier.encode('utf-8')
+            base = self.stringsOffset - nameIndex.size * self.recordCount
+            lo, hi = 0, self.recordCount
+            while lo < hi:
+                mid = (lo + hi) // 2
+                (i,) = nameIndex.unpack_from(self.buf, base + nameIndex.size * mid)
+                if self.rawString(self.recordHeader(i)[1]) < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo < self.recordCount:
+                (i,) = nameIndex.unpack_from(self.buf, base + nameIndex.size * lo)
+                if self.rawString(self.recordHeader(i)[1]) == key:
+                    return i
+            return None
+        if self.names is None:
+            self.names = {}
+            for i in range(self.recordCount):
+                self.names.setdefault(self.identifier(i), i)
+        return self.names.get(identifier)
+
+
+class LazyDecls:
+    """
+    sequence of the decls in an image, equivalent to parser.getResults() after
+    parsing the original json. Decls are parsed (and registered with the
+    parser) on first access, along with the types they depend on
+    """
+    def __init__(self, image):
+        self.image = image
+        self.builtins = parser.builtins[:]
+        self.decls = [None] * image.recordCount
+        self.pending = set()
+
+    def __len__(self):
+        return len(self.builtins) + len(self.decls)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i < len(self.builtins):
+            return self.builtins[i]
+        i -= len(self.builtins)
+        if not (0 <= i < len(self.decls)):
+            raise IndexError(i)
+        if self.decls[i] is None:
+            self.materialize(i)
+        return self.decls[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def lookup(self, identifier):
+        """
+        the decl for identifier (or None)
+        """
+        if parser.typeMap.has_key(identifier):
+            return parser.typeMap[identifier]
+        i = self.image.find(identifier)
+        if i is None:
+            return None
+        return self[len(self.builtins) + i]
+
+    def materialize(self, i):
+        """
+        parse record i, after the records for the types it references
+        """
+        rec = self.image.record(i)
+        self.pending.add(i)
+        types = [f.get(parser.FieldKind) for f in rec[parser.FieldFields]]
+        types.append(rec.get(parser.FieldReturn))
+        types.append(rec.get(parser.FieldType))
+        for t in types:
+            if t is None:
+                continue
+            ident = parser.identifierOf(t)
+            if parser.typeMap.has_key(ident):
+                continue
+            dep = self.image.find(ident)
+            if dep is not None and dep not in self.pending:
+                self[len(self.builtins) + dep]
+        if stats.enabled:
+            stats.count('ir.materialize')
+        parser.parser[rec[parser.FieldKind]](rec)
+        self.decls[i] = parser.typeMap[rec[parser.FieldIdent]]
+        self.pending.discard(i)
+
+
+def load(path):
+    """
+    mmap an image and return its (lazily built) decls
+    """
+    with open(path, 'rb') as inf:
+        buf = mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ)
+    return LazyDecls(Image(buf))
+
+
+#
+# snapshots
+#
+
+class Snapshot:
+    """
+    read-only registry backed by an image. Decls are built from the image when
+    looked up, and cached only while something references them. Unlike
+    LazyDecls nothing is registered with the parser, and the snapshot's decls
+    are independent of any other registry. A decl that is no longer referenced
+    is built anew on its next lookup, so decls must be told apart by identifier
+    rather than by identity
+    """
+    def __init__(self, image):
+        self.image = image
+        self.builtins = parser.builtins[:]
+        self.builtinMap = dict([(t.identifier, t) for t in self.builtins])
+        self.cache = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self.builtins) + self.image.recordCount
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i < len(self.builtins):
+            return self.builtins[i]
+        i -= len(self.builtins)
+        if not (0 <= i < self.image.recordCount):
+            raise IndexError(i)
+        return self.lookup(self.image.identifier(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def lookup(self, identifier):
+        """
+        the decl for identifier (or None)
+        """
+        t = self.builtinMap.get(identifier)
+        if t is None:
+            t = self.cache.get(identifier)
+        if t is None:
+            i = self.image.find(identifier)
+            if i is not None:
+                t = self.build(i)
+        return t
+
+    def varInfo(self, t):
+        identifier, quals, subscripts = parser.splitVarInfo(t)
+        return parser.makeVarInfo(self.lookup(identifier), quals, subscripts)
+
+    def varFields(self, fields):
+        return [sugar.VarDecl(f[parser.FieldIdent],
+                              self.varInfo(f[parser.FieldKind]))
+                    for f in fields]
+
+    def build(self, i):
+        """
+        build the decl of record i
+        """
+        rec = self.image.record(i)
+        identifier = rec[parser.FieldIdent]
+        kind = rec[parser.FieldKind]
+        if stats.enabled:
+            stats.count('ir.snapshot.build')
+        if kind == parser.KindNameEnum:
+            t = sugar.EnumDecl(identifier,
+                               [sugar.ConstDecl(c[parser.FieldIdent],
+                                                c[parser.FieldValue])
+                                    for c in rec[parser.FieldFields]])
+        elif kind == parser.KindNameTypedef:
+            t = sugar.AliasDecl(identifier, self.varInfo(rec[parser.FieldType]))
+        elif kind == parser.KindNameStruct:
+            # cached before the fields are built, since a struct may refer to
+            # itself through a pointer
+            t = sugar.StructDecl(identifier, [])
+            self.cache[identifier] = t
+            t.fields = self.varFields(rec[parser.FieldFields])
+        else:
+            t = sugar.FunctionDecl(identifier,
+                                   self.varFields(rec[parser.FieldFields]),
+                                   self.varInfo(rec[parser.FieldReturn]))
+        self.cache[identifier] = t
+        return t
+
+
+def freeze(decls, path=None):
+    """
+    encode parsed decls into an image and return a Snapshot of it. The image
+    is held in an anonymous shared mapping (inherited by worker processes
+    forked afterwards), or written to path to be attached to by any process
+    """
+    image = fromRecords(recordsFromDecls(decls))
+    if path is not None:
+        with open(path, 'wb') as outf:
+            outf.write(image)
+        return attach(path)
+    buf = mmap.mmap(-1, len(image))
+    buf.write(image)
+    return Snapshot(Image(buf))
+
+
+def attach(path):
+    """
+    the Snapshot of an image file
+    """
+    with open(path, 'rb') as inf:
+        buf = mmap.mmap(inf.fileno(), 0, access=mmap.ACCESS_READ)
+    return Snapshot(Image(buf))
+
+
+if __name__ == '__main__':
+    convert(sys.argv[1], sys.argv[2])
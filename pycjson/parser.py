@@ -4,6 +4,8 @@ descriptions that is convenient for Python based source-level tools
 """
 
 import json
+import hashlib
+import stats
 from sugar import *
 
 #
@@ -16,11 +18,13 @@ FieldFields     = 'fields'
 FieldReturn     = 'return'
 FieldValue      = 'value'
 FieldIdent      = 'identifier'
+FieldType       = 'type'
 
 # kind/type class
 KindNameStruct  = 'struct'
 KindNameEnum    = 'enum'
 KindNameFunction= 'function'
+KindNameTypedef = 'typedef'
 
 # C reserved identifiers needed
 KeywordConst    = 'const'
@@ -53,13 +57,28 @@ builtins = [BuiltinDecl(ident, width)
 typeMap = None
 declList = None
 
+# the records registered by parseBatch keyed by identifier (anonymous enums are
+# keyed by identifier and structural hash), along with the index of the unit
+# that registered them
+batchRecords = None
+
+# hashes of the raw json text of the units seen by parseBatch
+unitHashes = None
+
+# (identifier, first unit, conflicting unit) for each conflicting redefinition
+# encountered by parseBatch
+conflicts = None
+
 def reset():
     """
     reset the parser to intial state
     """
-    global typeMap, declList
+    global typeMap, declList, batchRecords, unitHashes, conflicts
     typeMap = {}
     declList = builtins[:]
+    batchRecords = {}
+    unitHashes = set()
+    conflicts = []
     for t in  builtins: typeMap[t.identifier] = t
 
 
@@ -117,9 +136,9 @@ def parseSubscripts(part):
     return [int(sub[1:]) for sub in subs]
 
 
-def parseVarInfo(t):
+def splitVarInfo(t):
     """
-    parse type information
+    split type information into its identifier, qualifiers and subscripts
     """
     identifier = ""
     quals      = []
@@ -131,7 +150,58 @@ def parseVarInfo(t):
         elif isIdentifierCandidate(part): identifier = part
         else: subscripts = parseSubscripts(part)
     
-    return VarInfo(findOrCreateDeclForIdent(identifier), quals, subscripts)
+    return identifier, quals, subscripts
+
+
+def identifierOf(t):
+    """
+    the identifier of the type referenced by type information
+    """
+    return splitVarInfo(t)[0]
+
+
+def makeVarInfo(decl, quals, subscripts):
+    """
+    create the VarInfo for a var of type decl
+    """
+    if (decl.kind == KindAlias) \
+            and (decl.typeInfo.hasQual() or decl.typeInfo.isArray()):
+        # fold the qualifiers/subscripts of the alias into the var (i.e.
+        # 'const str_t' with str_t = 'char *' becomes 'char * const')
+        alias = decl.typeInfo
+        decl = alias.declType
+        quals = alias.quals + quals
+        subscripts = subscripts + alias.subscripts
+    return VarInfo(decl, quals, subscripts)
+
+
+def typeString(info):
+    """
+    the type information string of a VarInfo (the inverse of parseVarInfo,
+    i.e. 'greeting_t const *')
+    """
+    parts = [info.declType.identifier]
+    for q in info.quals:
+        if q == QualPtr:
+            parts.append(KeywordPtr)
+        else:
+            parts.append(KeywordConst)
+    if info.isArray():
+        parts.append(''.join(['[%d]' % n for n in info.subscripts]))
+    return ' '.join(parts)
+
+
+def parseVarInfo(t):
+    """
+    parse type information
+    """
+    if stats.enabled:
+        start = stats.clock()
+    identifier, quals, subscripts = splitVarInfo(t)
+    info = makeVarInfo(findOrCreateDeclForIdent(identifier), quals, subscripts)
+    if stats.enabled:
+        stats.addTime('parser.parseVarInfo', stats.clock() - start)
+    return info
             
 
 def  parseVarFields(fields):
@@ -164,6 +234,19 @@ def parseFunction(func):
     addDecl(t)
 
 
+def parseTypedef(typedef):
+    """
+    decode type alias
+    """
+    identifier, aliased = valsForKeys(typedef, FieldIdent, FieldType)
+    if not typeMap.has_key(identifierOf(aliased)):
+        # aliases of types we can't represent (i.e. int, or a struct pointer
+        # to an undeclared struct) are ignored, as they were before typedefs
+        # were emitted
+        return
+    addDecl(AliasDecl(identifier, parseVarInfo(aliased)))
+
+
 def parseConstant(const):
     """
     parse a constants
@@ -177,14 +260,17 @@ def parseEnum(enum):
     parse an enumerated type
     """
     identifier, fields = valsForKeys(enum, FieldIdent, FieldFields)
-    t = EnumDecl(identifier, [parseConstant(c) for c in fields])
-    if isAnonymous(t) and isDeclKnown(t):
+    consts = [parseConstant(c) for c in fields]
+    if (identifier == AnonymousEnum) and typeMap.has_key(identifier):
         # handle adding fields to anonymously specified enumerated type
-        enum = typeMap[identifier]
-        enum.fields += t.fields
+        if stats.enabled:
+            start = stats.clock()
+        typeMap[identifier].addFields(consts)
+        if stats.enabled:
+            stats.addTime('parser.enumMerge', stats.clock() - start)
     else:
         # add ordinary enum decl
-        addDecl(t)
+        addDecl(EnumDecl(identifier, consts))
  
     
 #
@@ -194,16 +280,82 @@ def parseEnum(enum):
 parser = {
     KindNameStruct   : parseStruct,
     KindNameFunction : parseFunction,
-    KindNameEnum     : parseEnum
+    KindNameEnum     : parseEnum,
+    KindNameTypedef  : parseTypedef
 }
 
+def parseRecords(records):
+    """
+    parse already decoded json records
+    """
+    with stats.timed('parser.records'):
+        for rec in records:
+            if stats.enabled:
+                stats.count('records.' + rec[FieldKind])
+            parser[rec[FieldKind]](rec)
+    return declList
+
+
 def parse(inf):
     """
     parse json input file
     """
-    for rec in json.load(inf):
-        parser[rec[FieldKind]](rec)
+    with stats.timed('parser.json'):
+        records = json.load(inf)
+    return parseRecords(records)
+
+
+def recordHash(rec):
+    """
+    structural hash of a json record
+    """
+    return hashlib.sha1(json.dumps(rec, sort_keys=True)).digest()
+
+
+def parseBatch(units):
+    """
+    parse the json records of several translation units into one registry.
+    Units are lists of records, or the json text of one. Records that are
+    structurally identical to one already registered (i.e. decls from a header
+    included by many units) are skipped, so only unique decls are parsed, and
+    units given as text are skipped whole when their text was seen before. A
+    record that redefines an identifier with a different structure is recorded
+    in conflicts, and the first definition is kept
+    """
+    for (unit, records) in enumerate(units):
+        if isinstance(records, basestring):
+            h = hashlib.sha1(records).digest()
+            if stats.enabled:
+                stats.hit('parser.batchUnit', h in unitHashes)
+            if h in unitHashes:
+                continue
+            unitHashes.add(h)
+            records = json.loads(records)
+        for rec in records:
+            key = rec[FieldIdent]
+            if key == AnonymousEnum:
+                # repeated anonymous enums are merged rather than conflicting
+                key = (key, recordHash(rec))
+            if stats.enabled:
+                stats.hit('parser.batch', batchRecords.has_key(key))
+            if batchRecords.has_key(key):
+                # only records of known identifiers are compared
+                (seen, first) = batchRecords[key]
+                if seen != rec:
+                    conflicts.append((rec[FieldIdent], first, unit))
+                continue
+            batchRecords[key] = (rec, unit)
+            if stats.enabled:
+                stats.count('records.' + rec[FieldKind])
+            parser[rec[FieldKind]](rec)
     return declList
+
+
+def getConflicts():
+    """
+    get the conflicting redefinitions found by parseBatch
+    """
+    return conflicts
         
     
 def getResults():
@@ -0,0 +1,185 @@
+"""
+opt-in instrumentation for the parser and the code generators. Records the wall
+time of each stage, per-kind record counts and other counters, cache hit rates
+and the time spent generating each decl, and exports them as a JSON report.
+
+Instrumentation is off by default. Call sites test the module level enabled
+flag before doing any work, so the cost when off is a single global lookup.
+
+environment:
+    PYCJSON_STATS=<path>    enable instrumentation, and write the JSON report
+                            to path when the process exits
+    PYCJSON_PROFILE=<path>  run the tool's main function (see run) under
+                            cProfile and write the profile to path
+"""
+
+import os
+import json
+import atexit
+from timeit import default_timer as clock
+
+enabled = False
+
+stages   = None # stage -> [calls, seconds]
+counters = None # name -> count
+decls    = None # writer -> {identifier: seconds}
+
+
+def reset():
+    """
+    discard everything recorded so far
+    """
+    global stages, counters, decls
+    stages = {}
+    counters = {}
+    decls = {}
+
+
+reset()
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+#
+# recording
+#
+
+class timed:
+    """
+    context manager that adds the time spent in its block to a stage
+    """
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        if enabled:
+            self.start = clock()
+        return self
+
+    def __exit__(self, *exc):
+        if enabled:
+            addTime(self.stage, clock() - self.start)
+        return False
+
+
+def addTime(stage, seconds):
+    entry = stages.setdefault(stage, [0, 0.0])
+    entry[0] += 1
+    entry[1] += seconds
+
+
+def count(name, n=1):
+    counters[name] = counters.get(name, 0) + n
+
+
+def hit(cache, isHit=True):
+    """
+    record a hit (or miss) for the named cache
+    """
+    if isHit:
+        count(cache + '.hit')
+    else:
+        count(cache + '.miss')
+
+
+def declTime(writer, identifier, seconds):
+    """
+    record the time a writer spent generating a decl
+    """
+    times = decls.setdefault(writer, {})
+    times[identifier] = times.get(identifier, 0.0) + seconds
+
+
+#
+# reporting
+#
+
+def hitRates():
+    rates = {}
+    for name in counters:
+        if name.endswith('.hit') or name.endswith('.miss'):
+            cache = name.rsplit('.', 1)[0]
+            hits = counters.get(cache + '.hit', 0)
+            rates[cache] = hits / float(hits + counters.get(cache + '.miss', 0))
+    return rates
+
+
+def report():
+    """
+    the recorded statistics as a json compatible dict
+    """
+    return {
+        'stages': dict([(k, {'calls': c, 'seconds': s})
+                            for (k, (c, s)) in stages.items()]),
+        'counters': counters,
+        'hitRates': hitRates(),
+        'decls': decls,
+    }
+
+
+def merge(other):
+    """
+    add a report (i.e. one recorded in a pool worker) to the statistics
+    """
+    for (stage, entry) in other['stages'].items():
+        mine = stages.setdefault(stage, [0, 0.0])
+        mine[0] += entry['calls']
+        mine[1] += entry['seconds']
+    for (name, n) in other['counters'].items():
+        count(name, n)
+    for (writer, times) in other['decls'].items():
+        for (identifier, seconds) in times.items():
+            declTime(writer, identifier, seconds)
+
+
+def collect(fn, *args):
+    """
+    pool worker wrapper. Returns fn's result along with the report of what fn
+    recorded (None when disabled), for the parent process to merge
+    """
+    if not enabled:
+        return (fn(*args), None)
+    # forked workers inherit whatever the parent recorded before the fork
+    reset()
+    return (fn(*args), report())
+
+
+def mergeResults(results):
+    """
+    merge the reports of a list of collect results, returns the fn results
+    """
+    for (_, other) in results:
+        if other is not None:
+            merge(other)
+    return [r for (r, _) in results]
+
+
+def dump(path):
+    """
+    write the report as json
+    """
+    with open(path, 'w') as outf:
+        json.dump(report(), outf, indent=4, sort_keys=True)
+
+
+def run(main, *args):
+    """
+    run a tool's main function, under cProfile when PYCJSON_PROFILE is set
+    """
+    path = os.environ.get('PYCJSON_PROFILE')
+    if not path:
+        return main(*args)
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(main, *args)
+    finally:
+        profiler.dump_stats(path)
+
+
+if os.environ.get('PYCJSON_STATS'):
+    enable()
+    atexit.register(dump, os.environ['PYCJSON_STATS'])
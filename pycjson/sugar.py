@@ -2,6 +2,8 @@
 data types used by the parser to generate a "sugary" reprentation of the input
 JSON file
 """
+import util
+
 #
 # constants
 #
@@ -86,14 +88,15 @@ class VarInfo:
         returns true if the function returns void
         """
         # FIXME should devise a cleaner way to test for void
-        return self.declType.identifier == 'void'
+        return util.resolveDecl(self.declType).identifier == 'void'
     
     def isString(self):
         """
         true if the field has a natural interpertation as a CString
         """
         # FIXME should devise a cleaner way to test for char
-        return self.isPointer() and (self.declType.identifier == 'char')
+        return self.isPointer() \
+                and (util.resolveDecl(self.declType).identifier == 'char')
     
     def isInputByRef(self):
         """
@@ -147,17 +150,47 @@ class StructDecl:
         
 class EnumDecl:
     """
-    introduces a new enumerated type
+    introduces a new enumerated type. The constants are indexed by name
+    (byName, name -> value) and by value (byValue, value -> name of the first
+    constant declared with that value)
     """
     def __init__(self, identifier, fields):
         self.kind = KindEnum
         self.identifier = identifier
-        self.fields = fields 
+        self.fields = []
+        self.byName = {}
+        self.byValue = {}
+        self.addFields(fields)
+
+    def addFields(self, fields):
+        """
+        append constants, keeping the indexes up to date
+        """
+        for c in fields:
+            self.fields.append(c)
+            self.byName[c.identifier] = c.value
+            self.byValue.setdefault(c.value, c.identifier)
 
     def __str__(self):
         return 'enum %s {%s}' %(self.identifier, stringifyRange(self.fields))   
 
 
+class AliasDecl:
+    """
+    introduces a new name for an existing type (typedef)
+    """
+    def __init__(self, identifier, typeInfo):
+        self.kind = KindAlias
+        self.identifier = identifier
+        self.typeInfo = typeInfo
+        # parent link used by util.resolveDecl (compressed to point directly
+        # at the non-alias type once resolved)
+        self.archetype = typeInfo.declType
+
+    def __str__(self):
+        return 'alias %s = %s' %(self.identifier, str(self.typeInfo))
+
+
 class FunctionDecl:
     """
     introduces a new function type
@@ -1,16 +1,68 @@
-
+from cStringIO import StringIO
+import sugar
+import stats
 
 TabStop = ' ' * 4
 
 
+class FileSink:
+    """
+    buffered file sink for OutputBuffer. When maxBytes is non-zero the output
+    is split into several files (path must then contain a '%d' that is replaced
+    with the file's sequence number). Files are only split at the boundaries
+    marked by the writer, so concatenating the files in order yields the
+    complete output
+    """
+    def __init__(self, path, maxBytes=0, bufferSize=1 << 16):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.bufferSize = bufferSize
+        self.paths = []
+        self.outf = None
+        self.size = 0
+
+    def _open(self):
+        """
+        open the next output file
+        """
+        path = self.path
+        if self.maxBytes:
+            path = path % len(self.paths)
+        self.paths.append(path)
+        self.outf = open(path, 'w', self.bufferSize)
+        self.size = 0
+
+    def write(self, s):
+        if self.outf is None:
+            self._open()
+        self.outf.write(s)
+        self.size += len(s)
+
+    def boundary(self):
+        """
+        roll over to a new file if the current file has reached its size cap
+        """
+        if self.maxBytes and (self.size >= self.maxBytes):
+            self.close()
+
+    def close(self):
+        if self.outf is not None:
+            self.outf.close()
+            self.outf = None
+
+
 class OutputBuffer:
     """
-    output buffer 
+    output buffer. Text is streamed into sink (any object with a write method),
+    which defaults to an in-memory string buffer
     """
-    def __init__(self, level=0):        
+    def __init__(self, level=0, sink=None):        
         self.indentLevel = level
         self.leadingIndent = TabStop * level 
-        self.buffer = []
+        if sink is None:
+            sink = StringIO()
+        self.sink = sink
+        self.splittable = hasattr(sink, 'boundary')
 
     def incIndent(self, count=1):
         """
@@ -30,23 +82,37 @@ class OutputBuffer:
         """
         write a line to the output buffer
         """
-        self.buffer += [self.leadingIndent] + [a for a in args] + ['\n']
+        self.sink.write(self.leadingIndent + ''.join(args) + '\n')
         
     def indent(self):
         """
         append leading indent
         """
-        self.buffer += [self.leadingIndent]
+        self.sink.write(self.leadingIndent)
     
     def write(self, *args):
         """
         write without appending any extra white space
         """
-        self.buffer += [a for a in args]
-        
+        self.sink.write(''.join(args))
+
+    def boundary(self):
+        """
+        mark a point (i.e. the end of a top-level definition) where the output
+        may be split across files
+        """
+        if self.splittable:
+            self.sink.boundary()
+
+    def close(self):
+        """
+        flush and close the sink
+        """
+        if self.splittable:
+            self.sink.close()
         
     def __str__(self):
-        return ''.join(self.buffer)
+        return self.sink.getvalue()
 
 
 def stripTypeDelim(s):
@@ -96,10 +162,25 @@ def resolveDecl(t):
     with another type. Since the <stdint.h> decls are treated as builtin types
     these types will resolve reflexively -- that is uint32_t resolves to
     uint32_t
+
+    The aliases form a union-find forest: each alias points at its archetype,
+    and every alias on a resolved path is compressed to point directly at the
+    root, so repeated resolution is amortized O(1) however deep the chain
     """
-    # FIXME since we don't yet support type aliasing we simply return the input
-    # value unchanged. In the future we should test to see if the type is
-    # an aliased type, and then if so, return it's architype
-    return t
+    if t.kind != sugar.KindAlias:
+        return t
+    root = t.archetype
+    if root.kind != sugar.KindAlias:
+        # direct alias, or a path that was already compressed
+        if stats.enabled:
+            stats.hit('util.resolveDecl', True)
+        return root
+    if stats.enabled:
+        stats.hit('util.resolveDecl', False)
+    while root.kind == sugar.KindAlias:
+        root = root.archetype
+    while t.archetype is not root:
+        t.archetype, t = root, t.archetype
+    return root
 
 
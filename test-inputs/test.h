@@ -23,6 +23,8 @@ typedef enum
 typedef struct
 {
     uint32_t it_was;
+    enum2_t mood;
+    char initial;
 } saying_t;
 
 
@@ -38,5 +40,9 @@ typedef struct
 void say_hello(const greeting_t* msg);
 
 void do_math(int32_t *x);
+
+uint32_t shout(const char* text);
+
+enum2_t set_mood(enum2_t mood, enum2_t *previous);
     
 #endif